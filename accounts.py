@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Bluesky accounts and concurrent posting across them.
+#
+# An Account bundles everything that used to be module globals in the
+# post_to_bluesky modules: credentials, the session token, the post template
+# and a rate-limit budget. Credentials are read from the environment when an
+# account is first used, not at import time, so one process can post as any
+# number of accounts.
+#
+# Built-in accounts are listed in ACCOUNT_SPECS. More can be added with the
+# BLUESKY_ACCOUNTS environment variable, a JSON object mapping account names
+# to specs with the same keys, e.g.
+#   {"dam": {"username_env": "BLUESKY_USERNAME_DAM", "password_env": "BLUESKY_APP_PASSWORD_DAM",
+#            "template": "{title}\n\nDjurgården Dam\n\n{url}"}}
+
+ACCOUNT_SPECS = {
+    "hockey": {
+        "username_env": "BLUESKY_USERNAME",
+        "password_env": "BLUESKY_APP_PASSWORD",
+        "template": "{title}\n\nDjurgården Hockey\n\n{url}",
+        "state_suffix": ""
+    },
+    "football": {
+        "username_env": "BLUESKY_USERNAME_FOOTBALL",
+        "password_env": "BLUESKY_APP_PASSWORD_FOOTBALL",
+        "template": "{title}\n\nDjurgården Fotboll\n\n{url}",
+        "state_suffix": "_football"
+    }
+}
+
+# Default rate-limit budget per account, well below Bluesky's write limits
+DEFAULT_POSTS_PER_HOUR = 60
+DEFAULT_MIN_POST_INTERVAL = 5
+
+# Stop waiting for an account's budget when it would take longer than this,
+# the remaining articles stay in the outbox for the next run
+MAX_BUDGET_WAIT_SECONDS = 30
+
+_accounts = {}
+_accounts_lock = threading.Lock()
+
+
+class Account:
+    def __init__(self, name, identifier, password, template,
+                 posts_per_hour=DEFAULT_POSTS_PER_HOUR, min_post_interval=DEFAULT_MIN_POST_INTERVAL, state_suffix=None):
+        self.name = name
+        self.identifier = identifier
+        self.password = password
+        self.template = template
+        self.posts_per_hour = posts_per_hour
+        self.min_post_interval = min_post_interval
+        self.access_token = None
+        self.refresh_jwt = None
+
+        # State keys for this account's posted news and outbox
+        state_suffix = f"_{name}" if state_suffix is None else state_suffix
+        self.posted_news_key = f"posted_news{state_suffix}.json"
+        self.outbox_key = f"outbox{state_suffix}.json"
+
+        self._lock = threading.Lock()
+        self._tokens = float(posts_per_hour)
+        self._refilled_at = time.monotonic()
+        self._last_post_at = None
+
+    def __repr__(self):
+        return f"Account({self.name!r}, {self.identifier!r})"
+
+    def _start_session(self):
+        from post_to_bluesky import create_session
+
+        session = create_session(self.identifier, self.password)
+        self.access_token = session.access_jwt if session else None
+        self.refresh_jwt = session.refresh_jwt if session else None
+
+    def get_access_token(self):
+        """Return the session token, creating the session on first use (None if that fails)."""
+        with self._lock:
+            if self.access_token is None:
+                self._start_session()
+            return self.access_token
+
+    def renew_session(self, expired_token):
+        """Replace an expired access token and return the new one (None if that fails).
+
+        The session is refreshed with its refresh token, or created again when
+        that doesn't work. Threads that hit the same expired token renew it once.
+        """
+        from post_to_bluesky import refresh_session
+
+        with self._lock:
+            if self.access_token is not None and self.access_token != expired_token:
+                return self.access_token
+            session = refresh_session(self.refresh_jwt) if self.refresh_jwt else None
+            if session:
+                self.access_token = session.access_jwt
+                self.refresh_jwt = session.refresh_jwt or self.refresh_jwt
+            else:
+                self._start_session()
+            return self.access_token
+
+    def _refill(self, now):
+        elapsed = now - self._refilled_at
+        self._tokens = min(self.posts_per_hour, self._tokens + elapsed * self.posts_per_hour / 3600)
+        self._refilled_at = now
+
+    def seconds_until_available(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refill(now)
+            wait = 0 if self._tokens >= 1 else (1 - self._tokens) * 3600 / self.posts_per_hour
+            if self._last_post_at is not None:
+                wait = max(wait, self._last_post_at + self.min_post_interval - now)
+            return max(wait, 0)
+
+    def try_acquire(self, now=None):
+        """Take one post from the budget if it is available right now."""
+        now = time.monotonic() if now is None else now
+        if self.seconds_until_available(now) > 0:
+            return False
+        with self._lock:
+            self._tokens -= 1
+            self._last_post_at = now
+            return True
+
+
+def account_specs():
+    specs = dict(ACCOUNT_SPECS)
+    extra = os.getenv("BLUESKY_ACCOUNTS")
+    if extra:
+        try:
+            specs.update(json.loads(extra))
+        except json.JSONDecodeError as e:
+            print(f"⚠️ Ignoring invalid BLUESKY_ACCOUNTS: {e}")
+    return specs
+
+
+def get_account(name):
+    with _accounts_lock:
+        if name not in _accounts:
+            specs = account_specs()
+            if name not in specs:
+                raise KeyError(f"Unknown Bluesky account: {name}")
+            spec = specs[name]
+            _accounts[name] = Account(
+                name,
+                os.getenv(spec["username_env"]),
+                os.getenv(spec["password_env"]),
+                spec["template"],
+                posts_per_hour=spec.get("posts_per_hour", DEFAULT_POSTS_PER_HOUR),
+                min_post_interval=spec.get("min_post_interval", DEFAULT_MIN_POST_INTERVAL),
+                state_suffix=spec.get("state_suffix")
+            )
+        return _accounts[name]
+
+
+def post_concurrently(queues, send, max_workers=4):
+    """Post queued articles for several accounts at once.
+
+    `queues` maps each Account to its articles in posting order and
+    `send(account, article)` posts one article, returning True on success.
+    Accounts take turns (round robin), each has at most one post in flight
+    so its own order is kept, and no account goes over its rate budget.
+    Returns a dict of account name to posted URLs.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    pending = {account: deque(articles) for account, articles in queues.items() if articles}
+    posted = {account.name: [] for account in queues}
+    turns = deque(pending)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while in_flight or any(pending.values()):
+            busy = {account for account, _ in in_flight.values()}
+            for _ in range(len(turns)):
+                if len(in_flight) >= max_workers:
+                    break
+                account = turns[0]
+                turns.rotate(-1)
+                if account in busy or not pending[account] or not account.try_acquire():
+                    continue
+                article = pending[account].popleft()
+                in_flight[executor.submit(send, account, article)] = (account, article)
+                busy.add(account)
+
+            if in_flight:
+                done, _ = wait(in_flight, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    account, article = in_flight.pop(future)
+                    try:
+                        if future.result():
+                            posted[account.name].append(article["url"])
+                    except Exception as e:
+                        print(f"⚠️ Failed to post {article['url']} as {account.name}: {e}")
+                continue
+
+            waiting = [account for account in pending if pending[account]]
+            delay = min(account.seconds_until_available() for account in waiting)
+            if delay > MAX_BUDGET_WAIT_SECONDS:
+                for account in waiting:
+                    print(f"⏸️ {account.name} is out of rate budget, leaving {len(pending[account])} articles queued")
+                break
+            time.sleep(delay)
+
+    return posted
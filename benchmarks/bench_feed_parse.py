@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import tracemalloc
+
+# Parse time and memory benchmark for RSS feeds.
+#
+# Compares feedparser (the fallback) with feed_reader's streaming parser on a
+# large feed: reading the first three entries as the fetchers do, and reading
+# every entry. Reports the best time of a few runs and the peak memory
+# allocated while parsing (tracemalloc). Fails if reading the first entries
+# with feed_reader is not both faster and smaller than with feedparser.
+#
+# Usage: python benchmarks/bench_feed_parse.py [feed.xml | number_of_items]
+#
+# Without a file, a SvenskaFans-like feed is generated (1900 items by default,
+# just under the 2 MB size cap for feeds in downloads.py).
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloads import max_bytes_for  # noqa: E402
+from feed_reader import read_entries  # noqa: E402
+
+DEFAULT_ITEMS = 1900
+
+ENTRIES_NEEDED = 3
+
+RUNS = 3
+
+ITEM = """    <item>
+      <title>Nyhet {i}: Djurgården inför helgens match på Hovet</title>
+      <link>https://www.svenskafans.com/ishockey/nyhet-{i}</link>
+      <description><![CDATA[<p>{body}</p>]]></description>
+      <pubDate>Sun, 02 Mar 2025 {hour:02d}:{minute:02d}:00 +0100</pubDate>
+      <guid>https://www.svenskafans.com/ishockey/nyhet-{i}</guid>
+      <enclosure url="https://cdn.svenskafans.com/images/{i}.jpg" type="image/jpeg" length="0"/>
+    </item>
+"""
+
+BODY = "Järnkaminerna tog emot bortalaget inför en fullsatt läktare och supportrarna sjöng hela matchen. " * 6
+
+
+def generate_feed(count):
+    items = "".join(ITEM.format(i=i, body=BODY, hour=23 - i // 60 % 24, minute=59 - i % 60) for i in range(count))
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n<rss version="2.0">\n  <channel>\n'
+        "    <title>SvenskaFans Djurgården</title>\n    <link>https://www.svenskafans.com/</link>\n"
+        f"{items}  </channel>\n</rss>\n"
+    ).encode("utf-8")
+
+
+def measure(parse, content):
+    best = None
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        parse(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    parse(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    import feedparser
+
+    argument = sys.argv[1] if len(sys.argv) > 1 else str(DEFAULT_ITEMS)
+    if argument.isdigit():
+        content = generate_feed(int(argument))
+        label = f"generated feed with {argument} items"
+        if len(content) > max_bytes_for("application/rss+xml"):
+            print("⚠️ The feed is larger than the feed cap in downloads.py, the fetchers would refuse it")
+    else:
+        with open(argument, "rb") as file:
+            content = file.read()
+        label = argument
+    print(f"{label}, {len(content) / 1_000_000:.2f} MB")
+
+    cases = [
+        ("feedparser, first entries", lambda data: feedparser.parse(data).entries[:ENTRIES_NEEDED]),
+        ("feed_reader, first entries", lambda data: read_entries(data, limit=ENTRIES_NEEDED)),
+        ("feedparser, all entries", lambda data: feedparser.parse(data).entries),
+        ("feed_reader, all entries", lambda data: read_entries(data)),
+    ]
+    results = {}
+    for name, parse in cases:
+        results[name] = measure(parse, content)
+        elapsed, peak = results[name]
+        print(f"{name:<28} {elapsed * 1000:>9.1f} ms {peak / 1_000_000:>8.2f} MB peak")
+
+    baseline_time, baseline_peak = results["feedparser, first entries"]
+    streaming_time, streaming_peak = results["feed_reader, first entries"]
+    print(f"First entries: {baseline_time / streaming_time:,.0f}x faster, {baseline_peak / max(streaming_peak, 1):,.0f}x less memory")
+    if streaming_time >= baseline_time or streaming_peak >= baseline_peak:
+        print("🚨 feed_reader is not faster and smaller than feedparser")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
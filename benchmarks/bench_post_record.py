@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+# Throughput benchmark for the pure post record builder.
+#
+# Builds records for a mix of ASCII, Swedish and emoji titles (including
+# titles long enough to be truncated) and reports records per second.
+#
+# Usage: python benchmarks/bench_post_record.py [number_of_records]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from post_record import build_record  # noqa: E402
+
+TEMPLATE = "{title}\n\nDjurgården Hockey\n\n{url}\n\n#DIFhockey"
+
+TITLES = [
+    "Matchrapport: Djurgården vann mot AIK",
+    "Hänt i veckan – målvaktsbyte och nya förväntningar på Hovet",
+    "Supportrarna 💙💛❤️ firade segern 🇸🇪 till långt in på natten",
+    "Lång analys: " + "Järnkaminerna går mot en spännande säsong och öppnar för fler matcher. " * 6,
+]
+
+MIN_RECORDS_PER_SECOND = 2000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    articles = [
+        (f"https://www.difhockey.se/article/{i:06d}/view", TITLES[i % len(TITLES)])
+        for i in range(count)
+    ]
+
+    start = time.perf_counter()
+    for url, title in articles:
+        build_record(url, title, "Beskrivning av artikeln", template=TEMPLATE)
+    elapsed = time.perf_counter() - start
+
+    rate = count / elapsed
+    print(f"Built {count} records in {elapsed:.3f} s ({rate:,.0f} records/s)")
+    if rate < MIN_RECORDS_PER_SECOND:
+        print(f"🚨 Below the expected {MIN_RECORDS_PER_SECOND} records/s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import subprocess
+import sys
+import time
+
+# Startup benchmark for the cron entry points.
+#
+# Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+# each fetcher, prints the slowest top-level imports and fails if one of the
+# heavy parsers (feedparser, bs4) is loaded at import time.
+#
+# Usage: python benchmarks/bench_startup.py [module ...]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["news_fetcher", "news_fetcher_diffotboll"]
+
+# Packages that should only be imported when a run actually needs them
+LAZY_PACKAGES = {"feedparser", "bs4", "sgmllib"}
+
+RUNS = 5
+
+
+def measure_import(module):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        print(f"⚠️ Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+        return None
+
+    # Lines look like: "import time:       123 |       4567 |   package.sub"
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_part, cumulative_part, name = line.split("|", 2)
+        self_us = int(self_part.split(":")[1])
+        cumulative_us = int(cumulative_part)
+        # Keep the indentation, it encodes the import nesting level
+        imports.append((name[1:].rstrip(), self_us, cumulative_us))
+    return wall, imports
+
+
+def main():
+    modules = sys.argv[1:] or DEFAULT_MODULES
+    failed = False
+
+    for module in modules:
+        walls = []
+        imports = []
+        for _ in range(RUNS):
+            measured = measure_import(module)
+            if measured is None:
+                failed = True
+                break
+            wall, imports = measured
+            walls.append(wall)
+        if not walls:
+            continue
+
+        # Top-level imports have no leading indentation in the package column
+        top_level = [(name.strip(), cumulative) for name, _, cumulative in imports if not name.startswith("  ")]
+        top_level.sort(key=lambda x: x[1], reverse=True)
+        loaded = {name.strip().split(".")[0] for name, _, _ in imports}
+
+        print(f"\n{module}: best of {RUNS} interpreter runs {min(walls) * 1000:.1f} ms wall")
+        print(f"{'cumulative [ms]':>16}  import")
+        for name, cumulative in top_level[:10]:
+            print(f"{cumulative / 1000:>16.1f}  {name}")
+
+        eager = sorted(LAZY_PACKAGES & loaded)
+        if eager:
+            print(f"🚨 {module} imports {', '.join(eager)} at startup")
+            failed = True
+        else:
+            print(f"✅ {module} does not load {', '.join(sorted(LAZY_PACKAGES))} at startup")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
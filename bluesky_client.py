@@ -0,0 +1,503 @@
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+from urllib.parse import urlencode
+from dataclasses import dataclass, field
+from downloads import DownloadTooLarge, FileBody, SPOOL_MAX_MEMORY, max_bytes_for
+
+# Async Bluesky XRPC client with pluggable transports.
+#
+# This is the only code that talks to the PDS. post_to_bluesky.py wraps it
+# for the fetchers: post_single backs post_to_bluesky.post_to_bluesky, which
+# is used for single posts and by the multi-account cycle, post_batch backs
+# post_to_bluesky.post_batch_to_bluesky, and login/refresh back the sessions
+# in accounts.py. post_batch uploads all thumbnails concurrently, then submits
+# the records in ordered applyWrites chunks.
+#
+# RequestsTransport runs the calls through `requests` in worker threads and is
+# the default. BLUESKY_TRANSPORT=httpx selects HttpxTransport, which keeps one
+# httpx.AsyncClient (HTTP/2 when the `h2` package is installed) for all calls
+# to the PDS, so concurrent uploadBlob calls multiplex over a single
+# connection instead of opening one per image. It falls back to requests when
+# httpx is not installed.
+#
+# Thumbnails are downloaded into a SpooledTemporaryFile (see downloads.py) and
+# uploaded from it with their length, with either transport.
+#
+# Articles from the outbox carry a record key (`rkey`) and `created_at` (see
+# outbox.assign_post_key) that every attempt reuses. A create that fails is
+# checked with getRecord: if the record is already stored under its key, an
+# earlier attempt whose response was lost committed it, and it counts as
+# posted instead of being posted twice.
+
+BLUESKY_SERVICE = "https://bsky.social"
+
+TIMEOUT_SECONDS = 10
+
+# Uploads and applyWrites batches get longer
+LONG_TIMEOUT_SECONDS = 30
+
+# Maximum number of images downloaded and uploaded at the same time
+MAX_CONCURRENT_UPLOADS = 4
+
+# Delay between the single posts of a rejected batch
+DEFAULT_POST_DELAY_SECONDS = 5
+
+
+class XrpcError(Exception):
+    def __init__(self, status, error=None, message=None):
+        super().__init__(f"{status} {error or ''} {message or ''}".strip())
+        self.status = status
+        self.error = error
+        self.message = message
+
+
+@dataclass
+class Session:
+    did: str
+    handle: str
+    access_jwt: str
+    refresh_jwt: str = None
+    # Async callable taking the expired access token and returning a new one
+    # (or None), set for sessions that belong to an Account
+    renew: object = field(repr=False, default=None)
+
+
+@dataclass
+class BlobRef:
+    mime_type: str
+    size: int
+    ref: dict
+    raw: dict = field(repr=False, default=None)
+
+    def to_json(self):
+        return self.raw or {"$type": "blob", "ref": self.ref, "mimeType": self.mime_type, "size": self.size}
+
+
+@dataclass
+class CreatedRecord:
+    uri: str
+    cid: str
+
+
+@dataclass
+class Response:
+    status: int
+    headers: dict
+    # Bytes, or a rewound file for downloads with spool=True
+    content: object
+
+
+async def _iterate(body):
+    for chunk in body:
+        yield chunk
+
+
+class HttpxTransport:
+    name = "httpx"
+
+    def __init__(self):
+        import httpx
+
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        self.client = httpx.AsyncClient(http2=http2, timeout=TIMEOUT_SECONDS, follow_redirects=True)
+
+    async def request(self, method, url, headers=None, payload=None, content=None, timeout=TIMEOUT_SECONDS):
+        if hasattr(content, "read"):
+            # Streamed from the file with its length, so it isn't sent chunked
+            body = FileBody(content)
+            headers = dict(headers or {}, **{"Content-Length": str(len(body))})
+            content = _iterate(body)
+        response = await self.client.request(method, url, headers=headers, json=payload, content=content, timeout=timeout)
+        return Response(response.status_code, response.headers, response.content)
+
+    async def download(self, url, headers=None, max_bytes=None, spool=False):
+        # Streamed so an oversized body is aborted instead of read into memory
+        async with self.client.stream("GET", url, headers=headers) as response:
+            limit = max_bytes or max_bytes_for(response.headers.get("Content-Type"))
+            announced = response.headers.get("Content-Length")
+            if announced and announced.isdigit() and int(announced) > limit:
+                raise DownloadTooLarge(f"{url} is {announced} bytes, limit is {limit}")
+            sink = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) if spool else None
+            chunks = []
+            size = 0
+            try:
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > limit:
+                        raise DownloadTooLarge(f"{url} exceeded {limit} bytes")
+                    if sink is not None:
+                        sink.write(chunk)
+                    else:
+                        chunks.append(chunk)
+            except BaseException:
+                if sink is not None:
+                    sink.close()
+                raise
+            if sink is not None:
+                sink.seek(0)
+                return Response(response.status_code, response.headers, sink)
+            return Response(response.status_code, response.headers, b"".join(chunks))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class RequestsTransport:
+    name = "requests"
+
+    def __init__(self):
+        import requests
+
+        self.session = requests.Session()
+
+    async def request(self, method, url, headers=None, payload=None, content=None, timeout=TIMEOUT_SECONDS):
+        if hasattr(content, "read"):
+            # requests would size a plain file with fileno(), rolling a spool over to disk
+            content = FileBody(content)
+
+        def send():
+            return self.session.request(method, url, headers=headers, json=payload, data=content, timeout=timeout)
+
+        response = await asyncio.to_thread(send)
+        return Response(response.status_code, response.headers, response.content)
+
+    async def download(self, url, headers=None, max_bytes=None, spool=False):
+        from downloads import download
+
+        def fetch():
+            import requests
+
+            try:
+                result = download(url, headers=headers, timeout=TIMEOUT_SECONDS, max_bytes=max_bytes, spool=spool)
+            except requests.exceptions.HTTPError as e:
+                return Response(e.response.status_code, e.response.headers, b"")
+            return Response(result.status_code, result.headers, result.file if spool else result.content)
+
+        return await asyncio.to_thread(fetch)
+
+    async def close(self):
+        self.session.close()
+
+
+def get_transport(name=None):
+    """Return the transport named by BLUESKY_TRANSPORT, requests unless httpx is asked for."""
+    name = (name or os.getenv("BLUESKY_TRANSPORT") or "requests").lower()
+    if name == "httpx":
+        try:
+            return HttpxTransport()
+        except ImportError:
+            print("⚠️ httpx is not installed, falling back to requests")
+    return RequestsTransport()
+
+
+class BlueskyClient:
+    def __init__(self, transport=None, service=BLUESKY_SERVICE):
+        self.transport = transport or get_transport()
+        self.service = service
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.transport.close()
+
+    async def _xrpc(self, method, nsid, session=None, payload=None, content=None, content_type=None, token=None,
+                    timeout=TIMEOUT_SECONDS, params=None):
+        headers = {}
+        if token or session is not None:
+            headers["Authorization"] = f"Bearer {token or session.access_jwt}"
+        if content_type:
+            headers["Content-Type"] = content_type
+        url = f"{self.service}/xrpc/{nsid}" + (f"?{urlencode(params)}" if params else "")
+        response = await self.transport.request(method, url, headers=headers, payload=payload, content=content,
+                                                timeout=timeout)
+        try:
+            body = json.loads(response.content) if response.content else {}
+        except ValueError:
+            body = {}
+        expired = response.status == 401 or (response.status == 400 and body.get("error") == "ExpiredToken")
+        if expired and token is None and session is not None and await self.renew_session(session):
+            # Repeat the call once with the new token
+            return await self._xrpc(method, nsid, session, payload, content, content_type, token=session.access_jwt,
+                                    timeout=timeout, params=params)
+        if response.status >= 400:
+            raise XrpcError(response.status, body.get("error"), body.get("message"))
+        return body
+
+    async def create_session(self, identifier, password):
+        body = await self._xrpc("POST", "com.atproto.server.createSession", payload={"identifier": identifier, "password": password})
+        return Session(body["did"], body["handle"], body["accessJwt"], body.get("refreshJwt"))
+
+    async def refresh_session(self, session):
+        """Replace the session's access token using its refresh token."""
+        body = await self._xrpc("POST", "com.atproto.server.refreshSession", token=session.refresh_jwt)
+        session.access_jwt = body["accessJwt"]
+        session.refresh_jwt = body.get("refreshJwt", session.refresh_jwt)
+
+    async def renew_session(self, session):
+        """Replace an expired access token, returns False if that failed.
+
+        Sessions that belong to an Account are renewed through it, so threads
+        posting for the same account renew an expired token only once.
+        """
+        print(f"Session for {session.handle} expired, renewing it")
+        if session.renew is not None:
+            access_jwt = await session.renew(session.access_jwt)
+            if not access_jwt:
+                return False
+            session.access_jwt = access_jwt
+            return True
+        if not session.refresh_jwt:
+            return False
+        try:
+            await self.refresh_session(session)
+        except XrpcError as e:
+            print(f"⚠️ Failed to refresh session: {e}")
+            return False
+        return True
+
+    async def upload_blob(self, session, data, mime_type):
+        """Upload bytes or a file (streamed from the start with its length)."""
+        body = await self._xrpc("POST", "com.atproto.repo.uploadBlob", session, content=data, content_type=mime_type,
+                                timeout=LONG_TIMEOUT_SECONDS)
+        blob = body["blob"]
+        return BlobRef(blob.get("mimeType", mime_type), blob.get("size"), blob.get("ref"), raw=blob)
+
+    async def create_record(self, session, record, collection="app.bsky.feed.post", rkey=None):
+        payload = {"repo": session.did, "collection": collection, "record": record}
+        if rkey:
+            payload["rkey"] = rkey
+        body = await self._xrpc("POST", "com.atproto.repo.createRecord", session, payload=payload)
+        return CreatedRecord(body["uri"], body["cid"])
+
+    async def apply_writes(self, session, records, collection="app.bsky.feed.post", rkeys=None):
+        writes = []
+        for record, rkey in zip(records, rkeys or [None] * len(records)):
+            write = {"$type": "com.atproto.repo.applyWrites#create", "collection": collection, "value": record}
+            if rkey:
+                write["rkey"] = rkey
+            writes.append(write)
+        body = await self._xrpc("POST", "com.atproto.repo.applyWrites", session, payload={
+            "repo": session.did,
+            "writes": writes
+        }, timeout=LONG_TIMEOUT_SECONDS)
+        results = body.get("results") or []
+        if len(results) != len(records):
+            # Older PDS versions don't return results, the writes were still applied
+            return [None] * len(records)
+        return [CreatedRecord(result.get("uri"), result.get("cid")) for result in results]
+
+    async def record_exists(self, session, rkey, collection="app.bsky.feed.post"):
+        try:
+            await self._xrpc("GET", "com.atproto.repo.getRecord", session,
+                             params={"repo": session.did, "collection": collection, "rkey": rkey})
+            return True
+        except XrpcError as e:
+            if e.error == "RecordNotFound":
+                return False
+            raise
+
+    async def download(self, url, headers=None, max_bytes=None, spool=False):
+        """GET a URL outside the PDS with a byte cap (see downloads.py), raises DownloadTooLarge.
+
+        With `spool=True` the response content is a rewound SpooledTemporaryFile,
+        the caller closes it.
+        """
+        return await self.transport.download(url, headers=headers, max_bytes=max_bytes, spool=spool)
+
+
+async def _thumbnail(client, session, article, semaphore):
+    from post_to_bluesky import image_request_headers
+
+    # An image already downloaded for several accounts (see post_to_bluesky.prepare_article)
+    if article.get("image"):
+        data, mime_type = article["image"]
+        if hasattr(data, "read"):
+            data.seek(0)
+            data = data.read()
+        async with semaphore:
+            try:
+                blob = await client.upload_blob(session, data, mime_type)
+                return blob.to_json()
+            except Exception as e:
+                print(f"⚠️ Failed to upload image: {e}")
+                return None
+
+    image_url = article.get("image_url")
+    if not image_url:
+        return None
+    async with semaphore:
+        response = None
+        try:
+            response = await client.download(image_url, headers=image_request_headers(image_url),
+                                             max_bytes=max_bytes_for("image/"), spool=True)
+            mime_type = response.headers.get("Content-Type", "")
+            if response.status >= 400 or not mime_type.startswith("image/"):
+                print(f"⚠️ Skipping image {image_url}: {response.status} {mime_type}")
+                return None
+            blob = await client.upload_blob(session, response.content, mime_type)
+            return blob.to_json()
+        except Exception as e:
+            print(f"⚠️ Failed to upload image {image_url}: {e}")
+            return None
+        finally:
+            if response is not None and hasattr(response.content, "close"):
+                response.content.close()
+
+
+async def login(identifier, password, transport=None, attempts=3):
+    """Create a session, returns the Session or None after `attempts` failed tries."""
+    async with BlueskyClient(transport) as client:
+        for attempt in range(attempts):
+            try:
+                return await client.create_session(identifier, password)
+            except Exception as e:
+                print(f"⚠️ Authentication failed for {identifier} (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(5)
+    return None
+
+
+async def refresh(refresh_jwt, transport=None):
+    """Exchange a refresh token for a new session, returns the Session or None."""
+    async with BlueskyClient(transport) as client:
+        session = Session(None, None, None, refresh_jwt)
+        try:
+            await client.refresh_session(session)
+        except Exception as e:
+            print(f"⚠️ Failed to refresh session: {e}")
+            return None
+        return session
+
+
+async def _open_session(account, access_token):
+    # The account owns the session: it logs in on first use and renews
+    # expired tokens, see Account.renew_session
+    if access_token is None:
+        access_token = await asyncio.to_thread(account.get_access_token)
+        if access_token is None:
+            raise RuntimeError(f"Authentication failed for {account.name}")
+    return Session(account.identifier, account.identifier, access_token, account.refresh_jwt,
+                   renew=lambda expired_token: asyncio.to_thread(account.renew_session, expired_token))
+
+
+async def _prepare_records(client, session, account, articles):
+    """Fill in missing metadata, upload the thumbnails concurrently and build the records."""
+    from post_record import build_record
+    from post_to_bluesky import fetch_opengraph_metadata
+
+    # Fill in missing metadata from the article page's OpenGraph tags. An
+    # article that can't be prepared is skipped, the rest are still posted.
+    ready = []
+    for article in articles:
+        article = dict(article)
+        try:
+            if not (article.get("title") and article.get("description")):
+                title, description, image_url = await asyncio.to_thread(fetch_opengraph_metadata, article["url"])
+                article.update(title=title, description=description, image_url=article.get("image_url") or image_url)
+        except Exception as e:
+            print(f"⚠️ Failed to prepare post for {article['url']}: {e}")
+            continue
+        ready.append(article)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+    thumbs = await asyncio.gather(*(_thumbnail(client, session, article, semaphore) for article in ready))
+    prepared = []
+    for article, thumb in zip(ready, thumbs):
+        created_at = article.get("created_at")
+        if created_at is not None:
+            created_at = datetime.datetime.fromtimestamp(created_at, datetime.timezone.utc)
+        try:
+            record = build_record(article["url"], article["title"], article["description"], thumb=thumb,
+                                  template=account.template, created_at=created_at)
+        except Exception as e:
+            print(f"⚠️ Failed to prepare post for {article['url']}: {e}")
+            continue
+        prepared.append((article["url"], record, article.get("rkey")))
+    return prepared
+
+
+async def _create(client, session, url, record, rkey):
+    """Post one record with createRecord, returns True if it is posted."""
+    try:
+        await client.create_record(session, record, rkey=rkey)
+        return True
+    except XrpcError as e:
+        error = e
+    except Exception as e:
+        print(f"⚠️ Failed to post {url}: {e}")
+        return False
+
+    # Rejected, possibly because an earlier attempt already created it
+    try:
+        if rkey and await client.record_exists(session, rkey):
+            print(f"Already posted by an earlier attempt: {url}")
+            return True
+    except Exception as e:
+        print(f"⚠️ Failed to look up {url}: {e}")
+    print(f"⚠️ Failed to post {url}: {error}")
+    return False
+
+
+async def post_single(account, article, access_token=None, transport=None):
+    """Post one article for an account with uploadBlob and createRecord over one connection.
+
+    Uses `access_token` when given, otherwise the account's session.
+    Returns True if the article was posted.
+    """
+    async with BlueskyClient(transport) as client:
+        session = await _open_session(account, access_token)
+        prepared = await _prepare_records(client, session, account, [article])
+        if not prepared:
+            return False
+        (url, record, rkey), = prepared
+        if not await _create(client, session, url, record, rkey):
+            return False
+        print(f"✅ Successfully posted: {record['embed']['external']['title']}")
+        return True
+
+
+async def post_batch(account, articles, access_token=None, transport=None, batch_size=10,
+                     post_delay=DEFAULT_POST_DELAY_SECONDS):
+    """Post articles for an account over one shared connection.
+
+    Records are submitted in ordered applyWrites chunks. A chunk the server
+    rejects is posted with single createRecord calls, `post_delay` seconds
+    apart. A chunk without a response stays queued, the PDS may have
+    committed it, and its retry is recognised by the record keys. Uses `access_token` when given, otherwise the account's
+    session. Returns the URLs of the posted articles, in posting order.
+    """
+    async with BlueskyClient(transport) as client:
+        session = await _open_session(account, access_token)
+        prepared = await _prepare_records(client, session, account, articles)
+
+        posted_urls = []
+        for i in range(0, len(prepared), batch_size):
+            chunk = prepared[i:i + batch_size]
+            try:
+                results = await client.apply_writes(session, [record for _, record, _ in chunk],
+                                                    rkeys=[rkey for _, _, rkey in chunk])
+                for (url, _, _), result in zip(chunk, results):
+                    print(f"✅ Successfully posted: {url}" + (f" ({result.uri})" if result else ""))
+                    posted_urls.append(url)
+                continue
+            except XrpcError as e:
+                print(f"⚠️ Batch post failed: {e}, falling back to single posts")
+            except Exception as e:
+                # No response, the PDS may have committed the whole batch
+                print(f"⚠️ Batch post outcome unknown: {e}, leaving {len(chunk)} articles queued")
+                continue
+            for index, (url, record, rkey) in enumerate(chunk):
+                if index:
+                    await asyncio.sleep(post_delay)
+                if await _create(client, session, url, record, rkey):
+                    print(f"✅ Successfully posted: {url}")
+                    posted_urls.append(url)
+        return posted_urls
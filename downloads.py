@@ -0,0 +1,151 @@
+import tempfile
+import threading
+
+# Bounded downloads for pages, feeds, API responses and images.
+#
+# Every body is streamed in chunks with a byte cap that depends on its
+# content type. A response that announces a larger Content-Length is refused
+# before its body is read, and one that keeps streaming past the cap is
+# aborted, so a misbehaving upstream can't push an unbounded body into
+# memory. Images can be spilled to a temporary file instead of being kept in
+# memory. All downloads share one requests.Session, so connections to the
+# same host are reused.
+
+# Byte caps by content type prefix, checked in order
+MAX_BYTES_BY_TYPE = [
+    ("image/", 1_000_000),  # Bluesky rejects larger thumbnails anyway
+    ("text/html", 2_000_000),
+    ("application/xhtml", 2_000_000),
+    ("application/json", 1_000_000),
+    ("application/rss", 2_000_000),
+    ("application/atom", 2_000_000),
+    ("application/xml", 2_000_000),
+    ("text/xml", 2_000_000),
+]
+DEFAULT_MAX_BYTES = 1_000_000
+
+CHUNK_SIZE = 64 * 1024
+
+# Spilled bodies stay in memory up to this size before moving to a temp file
+SPOOL_MAX_MEMORY = 256 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class DownloadTooLarge(IOError):
+    pass
+
+
+def get_session():
+    global _session
+    import requests
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+        return _session
+
+
+def max_bytes_for(content_type):
+    content_type = (content_type or "").lower()
+    for prefix, limit in MAX_BYTES_BY_TYPE:
+        if content_type.startswith(prefix):
+            return limit
+    return DEFAULT_MAX_BYTES
+
+
+class FileBody:
+    """A file as a request body with a known length.
+
+    requests sizes a plain file with fileno(), which makes a
+    SpooledTemporaryFile roll over to disk. This body has a length and is
+    streamed in chunks, so an in-memory spool stays in memory.
+    """
+
+    def __init__(self, file, size=None):
+        self.file = file
+        if size is None:
+            file.seek(0, 2)
+            size = file.tell()
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class Download:
+    """A completed download, the body is either `content` bytes or a spooled `file`."""
+
+    def __init__(self, url, status_code, headers, encoding, content=None, file=None, size=0):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.encoding = encoding
+        self.content = content
+        self.file = file
+        self.size = size
+
+    @property
+    def content_type(self):
+        return self.headers.get("Content-Type", "")
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        import json
+
+        return json.loads(self.content)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def download(url, headers=None, timeout=10, max_bytes=None, spool=False):
+    """Download `url` with a byte cap, raising DownloadTooLarge when it is exceeded.
+
+    HTTP errors are raised as requests exceptions. With `spool=True` the body
+    is written to a SpooledTemporaryFile (rewound, in `Download.file`)
+    instead of being held as bytes.
+    """
+    response = get_session().get(url, headers=headers, timeout=timeout, stream=True)
+    try:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "")
+        limit = max_bytes or max_bytes_for(content_type)
+
+        announced = response.headers.get("Content-Length")
+        if announced and announced.isdigit() and int(announced) > limit:
+            raise DownloadTooLarge(f"{url} is {announced} bytes, limit for {content_type or 'unknown type'} is {limit}")
+
+        sink = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) if spool else None
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > limit:
+                if sink is not None:
+                    sink.close()
+                raise DownloadTooLarge(f"{url} exceeded {limit} bytes for {content_type or 'unknown type'}")
+            if sink is not None:
+                sink.write(chunk)
+            else:
+                chunks.append(chunk)
+    finally:
+        response.close()
+
+    if sink is not None:
+        sink.seek(0)
+        return Download(url, response.status_code, response.headers, response.encoding, file=sink, size=size)
+    return Download(url, response.status_code, response.headers, response.encoding, content=b"".join(chunks), size=size)
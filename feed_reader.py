@@ -0,0 +1,160 @@
+import calendar
+import datetime
+import io
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from xml.etree import ElementTree
+
+# Streaming RSS/Atom reader.
+#
+# The fetchers only need the newest few entries of a feed and only their
+# link, title, publish date and image. iter_entries walks the document with
+# ElementTree.iterparse, yields each <item>/<entry> as soon as it is complete,
+# drops it from the tree afterwards and stops reading at the limit or the
+# watermark, so the rest of the feed is never parsed.
+#
+# read_entries falls back to feedparser when the feed isn't well-formed XML
+# (feedparser is lenient about broken markup, HTML entities and bad
+# encodings). feedparser is only imported for that fallback.
+
+ITEM_TAGS = {"item", "entry"}
+DATE_TAGS = ("pubDate", "published", "updated", "date")
+
+MEDIA_NS = "{http://search.yahoo.com/mrss/}"
+
+
+@dataclass
+class FeedEntry:
+    link: str
+    title: str = ""
+    # UTC struct_time, like feedparser's entry.published_parsed
+    published_parsed: time.struct_time = None
+    image_url: str = None
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_date(value):
+    """Parse an RFC 822 (RSS) or ISO 8601 (Atom) date to a UTC struct_time, None if it can't be parsed."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            moment = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    # gmtime sets tm_isdst=0 like feedparser, so time.mktime gives the same result
+    return time.gmtime(moment.timestamp())
+
+
+def _image_url(element):
+    for child in element.iter():
+        name = child.tag
+        if _local_name(name) == "enclosure" and child.get("type", "").startswith("image/") and child.get("url"):
+            return child.get("url")
+        if name == MEDIA_NS + "content" and child.get("url") and (
+                child.get("medium") == "image" or child.get("type", "").startswith("image/")):
+            return child.get("url")
+        if name == MEDIA_NS + "thumbnail" and child.get("url"):
+            return child.get("url")
+    return None
+
+
+def _entry_from_element(element):
+    link = title = published = guid = None
+    for child in element:
+        name = _local_name(child.tag)
+        text = (child.text or "").strip()
+        if name == "title" and title is None:
+            title = text
+        elif name == "link":
+            # Atom links are attributes, RSS links are text
+            href = child.get("href")
+            if href is None:
+                link = link or text
+            elif child.get("rel", "alternate") == "alternate" and not link:
+                link = href
+        elif name == "guid" and child.get("isPermaLink", "true") == "true":
+            guid = text
+        elif name in DATE_TAGS and published is None:
+            published = parse_date(text)
+    return FeedEntry(link or guid, title or "", published, _image_url(element))
+
+
+def _iter_xml_entries(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    stack = []
+    for event, element in ElementTree.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(element)
+            continue
+        stack.pop()
+        if _local_name(element.tag) not in ITEM_TAGS:
+            continue
+        entry = _entry_from_element(element)
+        # Done with this entry, don't keep its subtree around
+        if stack:
+            stack[-1].remove(element)
+        if entry.link:
+            yield entry
+
+
+def _take(entries, limit=None, watermark=None):
+    """Yield entries until `limit` entries or one published at or before `watermark` (epoch seconds)."""
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    for entry in entries:
+        if watermark is not None and entry.published_parsed and calendar.timegm(entry.published_parsed) <= watermark:
+            return
+        yield entry
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
+
+def iter_entries(source, limit=None, watermark=None):
+    """Lazily yield FeedEntry objects from an RSS or Atom document (bytes or a file object).
+
+    Feeds list the newest entries first, so reading stops after `limit`
+    entries or at the first entry published at or before `watermark`.
+    Raises ElementTree.ParseError for malformed XML.
+    """
+    return _take(_iter_xml_entries(source), limit, watermark)
+
+
+def _feedparser_entries(content):
+    import feedparser
+
+    for entry in feedparser.parse(content).entries:
+        image_url = None
+        for enclosure in entry.get("enclosures", []):
+            if enclosure.get("type", "").startswith("image/") and enclosure.get("href"):
+                image_url = enclosure.get("href")
+                break
+        for media in entry.get("media_content", []) + entry.get("media_thumbnail", []):
+            if image_url:
+                break
+            image_url = media.get("url")
+        if entry.get("link"):
+            published = entry.get("published_parsed") or entry.get("updated_parsed")
+            yield FeedEntry(entry.link, entry.get("title", ""), published, image_url)
+
+
+def read_entries(content, limit=None, watermark=None):
+    """Return the first entries of a feed, see iter_entries; malformed feeds go through feedparser."""
+    try:
+        return list(iter_entries(content, limit, watermark))
+    except ElementTree.ParseError as e:
+        print(f"⚠️ Feed is not well-formed XML ({e}), parsing it with feedparser")
+        return list(_take(_feedparser_entries(content), limit, watermark))
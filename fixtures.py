@@ -0,0 +1,120 @@
+import json
+import os
+
+# Offline fixtures for the fetchers.
+#
+# install_fixtures(directory) mounts a transport adapter on every
+# requests.Session, and a mock transport on every httpx.AsyncClient (used by
+# bluesky_client.py), that answer from recorded files instead of the network.
+# The directory holds an index.json mapping URLs to files:
+#
+#   {"https://www.svenskafans.com/rss/team/251": {"file": "svenskafans_251.xml",
+#                                                 "content_type": "application/rss+xml"},
+#    "https://www.svenskafans.com/*": {"file": "svenskafans_article.html", "content_type": "text/html"}}
+#
+# Exact URLs win over patterns ending in "*", and longer patterns win over
+# shorter ones. Unknown URLs get a 404. Entries may set "status" and "method"
+# (e.g. POST for the Bluesky XRPC calls).
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_index(directory):
+    with open(os.path.join(directory, "index.json"), "r") as file:
+        return json.load(file)
+
+
+def match_fixture(index, url):
+    if url in index:
+        return index[url]
+    patterns = [pattern for pattern in index if pattern.endswith("*") and url.startswith(pattern[:-1])]
+    if patterns:
+        return index[max(patterns, key=len)]
+    return None
+
+
+def read_fixture(directory, index, method, url):
+    """Return (status, body, content_type) for a request, a 404 when no fixture matches."""
+    fixture = match_fixture(index, url)
+    if fixture and fixture.get("method", method) != method:
+        fixture = None
+    if fixture is None:
+        return 404, b"", "text/plain"
+    with open(os.path.join(directory, fixture["file"]), "rb") as file:
+        body = file.read()
+    return fixture.get("status", 200), body, fixture.get("content_type", "application/octet-stream")
+
+
+def _fixture_adapter_class():
+    from requests.adapters import BaseAdapter
+    from requests.models import Response
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+    from urllib3.response import HTTPResponse
+    import io
+
+    class FixtureAdapter(BaseAdapter):
+        def __init__(self, directory):
+            super().__init__()
+            self.directory = directory
+            self.index = load_index(directory)
+
+        def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+            status, body, content_type = read_fixture(self.directory, self.index, request.method, request.url)
+
+            headers = {"Content-Type": content_type, "Content-Length": str(len(body))}
+            response = Response()
+            response.status_code = status
+            response.headers = CaseInsensitiveDict(headers)
+            response.raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status, preload_content=False)
+            response.encoding = get_encoding_from_headers(response.headers)
+            response.url = request.url
+            response.request = request
+            response.connection = self
+            response.reason = "OK" if status < 400 else "Not Found"
+            if not stream:
+                response.content
+            return response
+
+        def close(self):
+            pass
+
+    return FixtureAdapter
+
+
+def _install_httpx_fixtures(directory):
+    try:
+        import httpx
+    except ImportError:
+        return
+
+    index = load_index(directory)
+
+    def handler(request):
+        status, body, content_type = read_fixture(directory, index, request.method, str(request.url))
+        return httpx.Response(status, content=body, headers={"Content-Type": content_type})
+
+    original_init = httpx.AsyncClient.__init__
+
+    def init_with_fixtures(self, *args, **kwargs):
+        kwargs["transport"] = httpx.MockTransport(handler)
+        original_init(self, *args, **kwargs)
+
+    httpx.AsyncClient.__init__ = init_with_fixtures
+
+
+def install_fixtures(directory=FIXTURES_DIR):
+    """Serve every requests call from the fixtures in `directory`."""
+    import requests
+
+    adapter = _fixture_adapter_class()(directory)
+    original_init = requests.Session.__init__
+
+    def init_with_fixtures(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    requests.Session.__init__ = init_with_fixtures
+    _install_httpx_fixtures(directory)
+    print(f"📼 Serving HTTP requests from fixtures in {directory}")
@@ -0,0 +1,100 @@
+import time
+from urllib.parse import urlsplit
+from state_backend import load_state, update_state
+
+# Per-host circuit breakers for news sources.
+#
+# Every request to an upstream host is reported as a success or failure.
+# After FAILURE_THRESHOLD consecutive failures the host's breaker opens. The
+# host is then skipped without waiting for timeouts until its cool-off has
+# passed. After that one trial request is let through (half-open): a success
+# closes the breaker, and a failure opens it again with a longer cool-off.
+# The state is stored through the state backend, so it carries over between
+# cron runs.
+
+FAILURE_THRESHOLD = 3
+
+# Cool-off doubles every time the breaker re-opens, up to COOL_OFF_MAX_SECONDS
+COOL_OFF_SECONDS = 15 * 60
+COOL_OFF_MAX_SECONDS = 4 * 60 * 60
+
+
+def load_host_health(backend, key):
+    health = load_state(backend, key, {})
+    if not isinstance(health, dict):
+        print(f"⚠️ Failed to load `{key}`, resetting host health.")
+        return {}
+    # Trials only last for the run that started them
+    for state in health.values():
+        state["half_open"] = False
+    return health
+
+
+def save_host_health(backend, key, health):
+    def merge(current):
+        current.update(health)
+        return current
+
+    try:
+        update_state(backend, key, merge, {})
+    except Exception as e:
+        print(f"⚠️ Failed to save `{key}`: {e}")
+
+
+def host_of(url):
+    return urlsplit(url).hostname or url
+
+
+def _state(health, url):
+    return health.setdefault(host_of(url), {"failures": 0, "opens": 0, "open_until": 0, "half_open": False})
+
+
+def allow_request(health, url, now=None):
+    """Return False while the host's breaker is open and its cool-off has not passed."""
+    if health is None:
+        return True
+    now = time.time() if now is None else now
+    state = health.get(host_of(url))
+    if not state or not state["open_until"]:
+        return True
+    if now < state["open_until"]:
+        print(f"⏭️ Skipping {host_of(url)}, circuit open for another {int(state['open_until'] - now)} s")
+        return False
+    if state["half_open"]:
+        # A trial request is already in flight during this run
+        return False
+    state["half_open"] = True
+    print(f"Trying {host_of(url)} again after cool-off")
+    return True
+
+
+def is_host_error(error):
+    """True for errors that say something about the host: network, HTTP status, oversized or undecodable body."""
+    import requests
+    from downloads import DownloadTooLarge
+
+    return isinstance(error, (requests.exceptions.RequestException, DownloadTooLarge, ValueError))
+
+
+def record_success(health, url):
+    if health is None:
+        return
+    state = _state(health, url)
+    if state["open_until"]:
+        print(f"✅ {host_of(url)} recovered, closing circuit")
+    state.update(failures=0, opens=0, open_until=0, half_open=False)
+
+
+def record_failure(health, url, now=None):
+    if health is None:
+        return
+    now = time.time() if now is None else now
+    state = _state(health, url)
+    state["failures"] += 1
+    state["last_failure_at"] = now
+    if state["half_open"] or state["failures"] >= FAILURE_THRESHOLD:
+        cool_off = min(COOL_OFF_MAX_SECONDS, COOL_OFF_SECONDS * 2 ** state["opens"])
+        state["opens"] += 1
+        state["open_until"] = now + cool_off
+        state["half_open"] = False
+        print(f"🚨 {host_of(url)} failed {state['failures']} times, opening circuit for {int(cool_off)} s")
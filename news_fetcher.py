@@ -1,10 +1,19 @@
-import requests
-import json
 import os
 import time
-import feedparser
 from dotenv import load_dotenv
-from post_to_bluesky import authenticate, post_to_bluesky
+from downloads import download
+from feed_reader import read_entries
+from host_health import load_host_health, save_host_health, allow_request, is_host_error, record_success, record_failure
+from outbox import load_outbox, save_outbox, enqueue, drop_posted, drain_outbox
+from posted_news import load_posted_news, save_posted_news
+from state_backend import get_state_backend
+from accounts import get_account
+from posting_plan import build_plan, write_plan
+from post_to_bluesky import DEFAULT_ACCOUNT, authenticate, post_to_bluesky, post_batch_to_bluesky
+
+# bs4 is imported inside the fetch functions so a quiet cron tick only loads
+# what it actually uses. feedparser is only loaded by feed_reader, for feeds
+# that aren't well-formed XML.
 
 # Load environment variables
 load_dotenv()
@@ -15,35 +24,43 @@ DIF_HOCKEY_API_URL = "https://www.difhockey.se/api/articles/site-news/list?page=
 # RSS-feed URL
 SVENSKAFANS_RSS_FEED_URL = "https://www.svenskafans.com/rss/team/251"
 
-# File to track posted news
+# State keys, these are the file names when STATE_BACKEND=file
+
+# Posted news, used to avoid posting the same article twice
 POSTED_NEWS_FILE = "posted_news.json"
 
-def load_posted_news():
-    try:
-        if os.path.exists(POSTED_NEWS_FILE):
-            with open(POSTED_NEWS_FILE, "r") as file:
-                return json.load(file)
-    except (json.JSONDecodeError, IOError):
-        print("⚠️ Failed to load `posted_news.json`, resetting file.")
-    return []
+# Articles waiting to be posted (retried with backoff)
+OUTBOX_FILE = "outbox.json"
 
+# Per-host circuit breaker state for the news sources
+HOST_HEALTH_FILE = "host_health.json"
 
-def save_posted_news(posted_news):
-    try:
-        with open(POSTED_NEWS_FILE, "w") as file:
-            json.dump(posted_news[-100:], file)  # Keep only the last 100 posts
-    except IOError as e:
-        print(f"⚠️ Failed to save `posted_news.json`: {e}")
+# Post several new articles through one applyWrites call instead of one by one
+BATCH_POSTING = os.getenv("BATCH_POSTING", "").lower() in ("1", "true", "yes")
+
+# Delay between single posts
+POST_DELAY_SECONDS = float(os.getenv("POST_DELAY_SECONDS", "5"))
 
 
-def fetch_dif_hockey_news():
+def fetch_dif_hockey_news(host_health=None):
+    if not allow_request(host_health, DIF_HOCKEY_API_URL):
+        return []
+    
     print("Fetching DIF Hockey news...")
     try:
-        response = requests.get(DIF_HOCKEY_API_URL)
+        response = download(DIF_HOCKEY_API_URL, timeout=10)
         print(f"Response: {response.status_code}")
-        response.raise_for_status()
-        
         data = response.json()
+    except Exception as e:
+        print(f"⚠️ Error fetching DIF Hockey news: {e}")
+        if is_host_error(e):
+            record_failure(host_health, DIF_HOCKEY_API_URL)
+        return []
+    
+    # The host answered, a response without articles is a quiet feed, not a failure
+    record_success(host_health, DIF_HOCKEY_API_URL)
+    
+    try:
         articles = []
         
         if "data" in data and "articleItems" in data["data"] and data["data"]["articleItems"]:
@@ -85,50 +102,73 @@ def fetch_dif_hockey_news():
                 })
             
             return articles
+        
+        print("⚠️ No articles in API response")
     except Exception as e:
-        print(f"⚠️ Error fetching DIF Hockey news: {e}")
+        print(f"⚠️ Error reading DIF Hockey news: {e}")
     return []
 
 
-def fetch_svenskafans_rss_news():
+def fetch_svenskafans_rss_news(posted_news=(), host_health=None):
+    if not allow_request(host_health, SVENSKAFANS_RSS_FEED_URL):
+        return []
+    
     print("Fetching SvenskaFans RSS news...")
+    browser_headers = {
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml",
+        "Referer": "https://www.svenskafans.com/",
+        "Accept-Language": "en-US,en;q=0.9"
+    }
+    
     try:
-        browser_headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml",
-            "Referer": "https://www.svenskafans.com/",
-            "Accept-Language": "en-US,en;q=0.9"
-        }
-        
-        response = requests.get(SVENSKAFANS_RSS_FEED_URL, headers=browser_headers, timeout=10)
-        response.raise_for_status()
-        
-        feed = feedparser.parse(response.text)
-        if not feed.entries:
+        response = download(SVENSKAFANS_RSS_FEED_URL, headers=browser_headers, timeout=10)
+    except Exception as e:
+        print(f"⚠️ Failed to fetch RSS feed: {e}")
+        if is_host_error(e):
+            record_failure(host_health, SVENSKAFANS_RSS_FEED_URL)
+        return []
+    record_success(host_health, SVENSKAFANS_RSS_FEED_URL)
+    
+    try:
+        # Only the first three entries are read, the rest of the feed is never parsed
+        entries = read_entries(response.content, limit=3)
+        if not entries:
             print("🚨 No RSS news found!")
             return []
         
         articles = []
-        for entry in feed.entries[:3]:
+        for entry in entries:
             # Extract timestamp
             timestamp = time.time()
-            if hasattr(entry, 'published_parsed') and entry.published_parsed:
+            if entry.published_parsed:
                 timestamp = time.mktime(entry.published_parsed)
             
             url = entry.link
-            title = entry.title if hasattr(entry, 'title') else ""
+            title = entry.title
+            
+            # Already posted articles are never posted again, so skip the
+            # article page download and HTML parsing for them
+            if url in posted_news:
+                print(f"Skipping already posted article: {url}")
+                continue
+            
+            # Leave the entry for a later run while its host is failing, so it
+            # is picked up with image and description once the host recovers
+            if not allow_request(host_health, url):
+                continue
             
             # Instead of parsing RSS, visit the actual article page to extract image
+            image_url = None
             try:
                 print(f"Fetching full article from {url}")
-                article_response = requests.get(url, headers=browser_headers, timeout=10)
-                article_response.raise_for_status()
+                article_response = download(url, headers=browser_headers, timeout=10)
+                record_success(host_health, url)
                 
                 from bs4 import BeautifulSoup
                 article_soup = BeautifulSoup(article_response.text, 'html.parser')
                 
                 # Look for OpenGraph image meta tag (most reliable)
-                image_url = None
                 og_image = article_soup.find('meta', property='og:image')
                 if og_image and og_image.get('content'):
                     image_url = og_image.get('content')
@@ -163,9 +203,15 @@ def fetch_svenskafans_rss_news():
             
             except Exception as e:
                 print(f"⚠️ Error fetching article page: {e}")
+                # Only network and HTTP errors count against the host, not parsing
+                if is_host_error(e):
+                    record_failure(host_health, url)
                 description = ""
                 # Continue with the URL but without image
             
+            # Fallback: image from the feed entry itself (enclosure or media:content)
+            image_url = image_url or entry.image_url
+            
             articles.append({
                 "url": url,
                 "timestamp": timestamp,
@@ -178,15 +224,15 @@ def fetch_svenskafans_rss_news():
         print(f"✅ Successfully fetched {len(articles)} RSS entries from SvenskaFans")
         return articles
     except Exception as e:
-        print(f"⚠️ Failed to fetch RSS feed: {e}")
+        print(f"⚠️ Failed to read RSS feed: {e}")
         return []
 
 
-def process_all_news(access_token):
-    posted_news = load_posted_news()
+def fetch_all_news(posted_news, outbox, host_health):
+    queued_urls = [item["url"] for item in outbox["pending"] + outbox["dead_letter"]]
     
     # Fetch all news
-    all_articles = fetch_dif_hockey_news() + fetch_svenskafans_rss_news()
+    all_articles = fetch_dif_hockey_news(host_health) + fetch_svenskafans_rss_news(posted_news + queued_urls, host_health)
     
     # Print timestamps before sorting
     print("\nArticles before sorting:")
@@ -203,14 +249,57 @@ def process_all_news(access_token):
         date_string = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(article["timestamp"]))
         print(f"- {article['source']}: {date_string} - {article['title']}")
     
+    return all_articles
+
+
+def plan_all_news(now=None):
+    """Return what process_all_news would post now, without posting or saving anything."""
+    backend = get_state_backend()
+    posted_news = load_posted_news(backend, POSTED_NEWS_FILE)
+    outbox = load_outbox(backend, OUTBOX_FILE)
+    host_health = load_host_health(backend, HOST_HEALTH_FILE)
+    
+    all_articles = fetch_all_news(posted_news, outbox, host_health)
+    return build_plan(get_account(DEFAULT_ACCOUNT), all_articles, posted_news, outbox, now)
+
+
+def process_all_news(access_token=None, post_delay=POST_DELAY_SECONDS):
+    backend = get_state_backend()
+    posted_news = load_posted_news(backend, POSTED_NEWS_FILE)
+    outbox = load_outbox(backend, OUTBOX_FILE)
+    host_health = load_host_health(backend, HOST_HEALTH_FILE)
+    
+    all_articles = fetch_all_news(posted_news, outbox, host_health)
+    save_host_health(backend, HOST_HEALTH_FILE, host_health)
+    
     print(f"\nProcessing {len(all_articles)} articles in chronological order (oldest first)")
     
-    # Post each article
+    # Queue new articles, the outbox keeps them until they are posted
     for article in all_articles:
-        url = article["url"]
-        source = article["source"]
+        if article["url"] not in posted_news and enqueue(outbox, article):
+            print(f"Queued {article['source']} article: {article['url']}")
+    
+    # Save the queue before posting, so a run that dies while posting doesn't
+    # lose the articles it queued. Items a previous run posted but failed to
+    # remove from the outbox are dropped here.
+    drop_posted(outbox, posted_news)
+    save_outbox(backend, OUTBOX_FILE, outbox, posted_news)
+    
+    def send(articles):
+        nonlocal access_token
+        # Only authenticate once there is actually something to post
+        if access_token is None:
+            access_token = authenticate()
         
-        if url not in posted_news:
+        if BATCH_POSTING and len(articles) > 1:
+            print(f"Batch posting {len(articles)} articles")
+            return post_batch_to_bluesky(access_token, articles, post_delay=post_delay)
+        
+        # Post each article
+        posted_urls = []
+        for article in articles:
+            url = article["url"]
+            source = article["source"]
             print(f"Posting {source} article: {url}")
             
             # We can directly pass the metadata to post_to_bluesky if needed
@@ -219,23 +308,50 @@ def process_all_news(access_token):
                 url,
                 title=article.get("title"),
                 description=article.get("description"),
-                image_url=article.get("image_url")
+                image_url=article.get("image_url"),
+                rkey=article.get("rkey"),
+                created_at=article.get("created_at")
             )
             
             if success:
-                posted_news.append(url)
+                posted_urls.append(url)
                 print(f"✅ Successfully posted {source} article")
             
             # Add delay between posts
-            time.sleep(5)
+            time.sleep(post_delay)
+        return posted_urls
+    
+    posted_urls = drain_outbox(outbox, send, posted_news=posted_news)
+    posted_news.extend(posted_urls)
     
-    # Save updated list of posted news
-    save_posted_news(posted_news)
+    # Save updated list of posted news and the remaining queue
+    save_posted_news(backend, POSTED_NEWS_FILE, posted_news)
+    save_outbox(backend, OUTBOX_FILE, outbox, posted_news)
 
 
 def main():
-    access_token = authenticate()
-    process_all_news(access_token)
+    import argparse
+    import contextlib
+    import sys
+    from profiling import add_profile_arguments, setup_fixtures, run_with_profile
+
+    parser = argparse.ArgumentParser(description="Fetch DIF Hockey news and post new articles to Bluesky.")
+    parser.add_argument("--plan", nargs="?", const="-", metavar="PATH",
+                        help="write what would be posted as JSON (default: stdout) instead of posting")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.plan is None:
+        # Fixture runs don't need to wait between posts
+        post_delay = 0 if setup_fixtures(args) else POST_DELAY_SECONDS
+        run_with_profile(args, lambda: process_all_news(post_delay=post_delay))
+        return
+
+    # Progress output goes to stderr so the plan can be piped
+    with contextlib.redirect_stdout(sys.stderr):
+        setup_fixtures(args)
+        plan = run_with_profile(args, plan_all_news)
+    write_plan(plan, args.plan)
 
 if __name__ == "__main__":
     main()
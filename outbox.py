@@ -0,0 +1,165 @@
+import random
+import time
+from post_record import new_tid
+from state_backend import load_state, update_state
+
+# Durable outbox for articles waiting to be posted.
+#
+# Fetchers enqueue new articles, and a drain step hands the due ones to a send
+# function. Failed items are retried with exponential backoff and jitter.
+# Items that keep failing are moved to a dead-letter list instead of being
+# retried forever. The outbox is stored through the state backend, so it
+# survives between cron runs.
+#
+# On its first attempt an article gets the record key and createdAt of its
+# post, and every retry reuses them. When the outcome of an attempt was
+# unknown, e.g. a timeout after the PDS committed the post, the retry then
+# finds the record under that key instead of posting it a second time.
+
+# Retry delays grow from BACKOFF_BASE_SECONDS up to BACKOFF_MAX_SECONDS
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 6 * 60 * 60
+
+# Number of failed attempts before an item goes to the dead-letter list
+MAX_ATTEMPTS = 6
+
+# Only keep the most recent dead-lettered items
+MAX_DEAD_LETTER = 100
+
+
+def empty_outbox():
+    return {"pending": [], "dead_letter": []}
+
+
+def load_outbox(backend, key):
+    outbox = load_state(backend, key, empty_outbox())
+    if not isinstance(outbox, dict):
+        print(f"⚠️ Failed to load `{key}`, resetting outbox.")
+        return empty_outbox()
+    outbox.setdefault("pending", [])
+    outbox.setdefault("dead_letter", [])
+    return outbox
+
+
+def merge_outbox(current, outbox, posted_urls=()):
+    """Merge this run's outbox into the stored one, this run wins for the items it touched."""
+    posted = set(posted_urls)
+    ours = {item["url"]: item for item in outbox["pending"]}
+    dead_urls = {item["url"] for item in outbox["dead_letter"]}
+
+    pending = []
+    for item in current.get("pending", []):
+        if item["url"] in posted or item["url"] in dead_urls:
+            continue
+        pending.append(ours.pop(item["url"], item))
+    pending.extend(item for item in outbox["pending"] if item["url"] in ours)
+
+    dead_letter = current.get("dead_letter", [])
+    stored_dead_urls = {item["url"] for item in dead_letter}
+    dead_letter += [item for item in outbox["dead_letter"] if item["url"] not in stored_dead_urls]
+    return {"pending": pending, "dead_letter": dead_letter[-MAX_DEAD_LETTER:]}
+
+
+def save_outbox(backend, key, outbox, posted_urls=()):
+    try:
+        update_state(backend, key, lambda current: merge_outbox(current, outbox, posted_urls), empty_outbox())
+    except Exception as e:
+        print(f"⚠️ Failed to save `{key}`: {e}")
+
+
+def backoff_delay(attempts):
+    """Delay before the next try after `attempts` failures (exponential, half jitter)."""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def enqueue(outbox, article, now=None):
+    """Add an article to the outbox unless it is already queued or dead-lettered."""
+    url = article["url"]
+    if any(item["url"] == url for item in outbox["pending"] + outbox["dead_letter"]):
+        return False
+
+    now = time.time() if now is None else now
+    outbox["pending"].append({
+        "url": url,
+        "article": article,
+        "attempts": 0,
+        "enqueued_at": now,
+        "next_attempt_at": now
+    })
+    return True
+
+
+def drop_posted(outbox, posted_news):
+    """Remove pending items that were already posted, e.g. by a run that failed to save its outbox."""
+    posted = set(posted_news)
+    dropped = [item["url"] for item in outbox["pending"] if item["url"] in posted]
+    if dropped:
+        outbox["pending"] = [item for item in outbox["pending"] if item["url"] not in posted]
+        print(f"Dropping {len(dropped)} already posted articles from the outbox")
+    return dropped
+
+
+def assign_post_key(article, now=None):
+    """Give an article its record key (`rkey`) and `created_at` on the first attempt, keep them after that."""
+    now = time.time() if now is None else now
+    article.setdefault("rkey", new_tid(now))
+    article.setdefault("created_at", now)
+    return article
+
+
+def due_items(outbox, now=None, posted_news=()):
+    """Pending items due for a try, skipping any whose URL is in `posted_news`."""
+    now = time.time() if now is None else now
+    posted = set(posted_news)
+    return [item for item in outbox["pending"] if item["next_attempt_at"] <= now and item["url"] not in posted]
+
+
+def settle_outbox(outbox, due, posted_urls, now=None):
+    """Remove the posted items and reschedule or dead-letter the due items that failed."""
+    now = time.time() if now is None else now
+    posted = set(posted_urls)
+    due_urls = {item["url"] for item in due}
+
+    pending = []
+    for item in outbox["pending"]:
+        if item["url"] in posted:
+            continue
+        if item["url"] in due_urls:
+            item["attempts"] += 1
+            item["last_attempt_at"] = now
+            if item["attempts"] >= MAX_ATTEMPTS:
+                print(f"🚨 Giving up on {item['url']} after {item['attempts']} attempts")
+                outbox["dead_letter"].append(item)
+                continue
+            item["next_attempt_at"] = now + backoff_delay(item["attempts"])
+            print(f"Retrying {item['url']} in {int(item['next_attempt_at'] - now)} s")
+        pending.append(item)
+    outbox["pending"] = pending
+
+
+def drain_outbox(outbox, send, now=None, posted_news=()):
+    """Send all due items and reschedule or dead-letter the failures.
+
+    `send` receives the due articles in order and returns the URLs that were
+    posted. Pending items already in `posted_news` are dropped, not sent.
+    When `send` raises, every due item counts as a failed attempt, so an item
+    that keeps crashing it is backed off and eventually dead-lettered.
+    Returns the posted URLs.
+    """
+    now = time.time() if now is None else now
+    drop_posted(outbox, posted_news)
+    due = due_items(outbox, now)
+    if not due:
+        return []
+
+    print(f"Draining {len(due)} of {len(outbox['pending'])} queued articles")
+    for item in due:
+        assign_post_key(item["article"], now)
+    try:
+        posted_urls = send([item["article"] for item in due])
+    except Exception as e:
+        print(f"⚠️ Failed to post the queued articles: {e}")
+        posted_urls = []
+    settle_outbox(outbox, due, posted_urls, now)
+    return posted_urls
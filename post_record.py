@@ -0,0 +1,175 @@
+import datetime
+import random
+import re
+import threading
+import time
+import unicodedata
+
+# Pure builder for app.bsky.feed.post records.
+#
+# Produces the post text, rich text facets (links and hashtags), external
+# embed and createdAt in one pass, with facet offsets counted in UTF-8 bytes
+# as the Bluesky API expects. Nothing here does network or file I/O, so the
+# same records can feed single posts, applyWrites batches and dry runs.
+
+# Bluesky rejects posts longer than 300 graphemes
+MAX_POST_GRAPHEMES = 300
+
+ELLIPSIS = "…"
+
+DEFAULT_TEMPLATE = "{title}\n\n{url}"
+
+# A hashtag starts after whitespace or at the start of the text and may not be only digits
+HASHTAG_PATTERN = re.compile(r"(?:^|(?<=\s))#(\w*[^\W\d]\w*)")
+
+ZERO_WIDTH_JOINER = "\u200d"
+
+# Record keys are TIDs: microseconds since the epoch and a 10 bit clock id,
+# written as 13 characters of base32-sortable
+TID_ALPHABET = "234567abcdefghijklmnopqrstuvwxyz"
+
+_tid_lock = threading.Lock()
+_last_tid_micros = 0
+
+# Latin, Greek and Cyrillic letters, punctuation and symbols without any
+# combining characters: every code point is its own grapheme
+SIMPLE_TEXT_PATTERN = re.compile("[\x00-\u02ff\u0370-\u0482\u048a-\u0590\u2000-\u200c\u200e-\u20cf\u2100-\u2fff]*")
+
+
+def _extends_grapheme(char, previous):
+    # Characters that belong to the grapheme started before them: combining
+    # marks, variation selectors, emoji skin tones, tag characters and
+    # anything glued on with a zero width joiner
+    if previous == ZERO_WIDTH_JOINER or char == ZERO_WIDTH_JOINER:
+        return True
+    code = ord(char)
+    if 0xFE00 <= code <= 0xFE0F or 0x1F3FB <= code <= 0x1F3FF or 0xE0020 <= code <= 0xE007F:
+        return True
+    return unicodedata.category(char) in ("Mn", "Mc", "Me")
+
+
+def split_graphemes(text):
+    """Split text into user-perceived characters (approximate grapheme clusters)."""
+    if text.isascii() or SIMPLE_TEXT_PATTERN.fullmatch(text):
+        return list(text)
+
+    graphemes = []
+    previous = ""
+    regional_indicators = 0
+    for char in text:
+        is_regional_indicator = 0x1F1E6 <= ord(char) <= 0x1F1FF
+        if graphemes and (
+            _extends_grapheme(char, previous)
+            or (is_regional_indicator and regional_indicators % 2 == 1)
+        ):
+            graphemes[-1] += char
+        else:
+            graphemes.append(char)
+        regional_indicators = regional_indicators + 1 if is_regional_indicator else 0
+        previous = char
+    return graphemes
+
+
+def grapheme_length(text):
+    if text.isascii() or SIMPLE_TEXT_PATTERN.fullmatch(text):
+        return len(text)
+    return len(split_graphemes(text))
+
+
+def truncate_graphemes(text, limit):
+    """Truncate text to at most `limit` graphemes, ending with an ellipsis when cut."""
+    if grapheme_length(text) <= limit:
+        return text
+    if limit <= 0:
+        return ""
+    return "".join(split_graphemes(text)[:limit - 1]).rstrip() + ELLIPSIS
+
+
+def render_text(template, title, url, max_graphemes=MAX_POST_GRAPHEMES):
+    """Render the post text, shortening the title so the whole post fits the limit."""
+    title = (title or "").strip()
+    text = template.format(title=title, url=url)
+    if grapheme_length(text) <= max_graphemes:
+        return text
+
+    budget = max_graphemes - grapheme_length(template.format(title="", url=url))
+    return template.format(title=truncate_graphemes(title, budget), url=url)
+
+
+def _byte_index(text, char_index, cache):
+    # Byte offsets are computed incrementally from the previous facet so the
+    # text is only encoded once overall
+    last_char, last_byte = cache
+    byte_index = last_byte + len(text[last_char:char_index].encode("utf-8"))
+    cache[0], cache[1] = char_index, byte_index
+    return byte_index
+
+
+def build_facets(text, links=()):
+    """Build link facets for each of `links` found in text and tag facets for hashtags."""
+    spans = []
+    for uri in links:
+        # The link normally comes after the title, so search from the end
+        start = text.rfind(uri)
+        if start != -1:
+            spans.append((start, start + len(uri), {"$type": "app.bsky.richtext.facet#link", "uri": uri}))
+    for match in HASHTAG_PATTERN.finditer(text):
+        start, end = match.span()
+        # Skip hashtags inside a link, e.g. a URL fragment
+        if any(link_start <= start < link_end for link_start, link_end, _ in spans):
+            continue
+        spans.append((start, end, {"$type": "app.bsky.richtext.facet#tag", "tag": match.group(1)}))
+
+    spans.sort(key=lambda span: span[0])
+    cache = [0, 0]
+    facets = []
+    for start, end, feature in spans:
+        byte_start = _byte_index(text, start, cache)
+        byte_end = _byte_index(text, end, cache)
+        facets.append({
+            "$type": "app.bsky.richtext.facet",
+            "index": {"byteStart": byte_start, "byteEnd": byte_end},
+            "features": [feature]
+        })
+    return facets
+
+
+def build_external_embed(url, title, description, thumb=None):
+    external = {"uri": url, "title": title or "", "description": description or ""}
+    if thumb:
+        external["thumb"] = thumb
+    return {"$type": "app.bsky.embed.external", "external": external}
+
+
+def new_tid(now=None):
+    """Return a new record key (TID), later calls always return larger keys."""
+    global _last_tid_micros
+
+    micros = int((time.time() if now is None else now) * 1_000_000)
+    with _tid_lock:
+        micros = _last_tid_micros = max(micros, _last_tid_micros + 1)
+    value = micros << 10 | random.getrandbits(10)
+    return "".join(TID_ALPHABET[value >> shift & 31] for shift in range(60, -1, -5))
+
+
+def format_created_at(moment=None):
+    if moment is None:
+        moment = datetime.datetime.now(datetime.timezone.utc)
+    return moment.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def build_record(url, title, description="", thumb=None, template=DEFAULT_TEMPLATE, created_at=None):
+    """Build a complete app.bsky.feed.post record for an article.
+
+    `template` is formatted with `title` and `url`; any hashtags in it become
+    tag facets. `thumb` is an already uploaded blob reference and
+    `created_at` a datetime (defaults to now).
+    """
+    text = render_text(template, title, url)
+    return {
+        "$type": "app.bsky.feed.post",
+        "text": text,
+        "facets": build_facets(text, links=(url,)),
+        "embed": build_external_embed(url, title, description, thumb),
+        "createdAt": format_created_at(created_at)
+    }
@@ -1,40 +1,53 @@
-import requests
-import json
-import os
-import time
-import datetime
-from bs4 import BeautifulSoup
+import asyncio
 from dotenv import load_dotenv
+from accounts import get_account
+from downloads import download, max_bytes_for, DownloadTooLarge
+
+# Posting entry points for the fetchers. They are thin synchronous wrappers
+# around bluesky_client.py, which holds the XRPC calls, batching, fallback and
+# session renewal. It uses requests unless BLUESKY_TRANSPORT=httpx is set.
+#
+# requests and bs4 are imported inside the functions that use them so that a
+# cron tick with nothing new to post never pays for loading them.
 
 # Load environment variables
 load_dotenv()
 
-BLUESKY_USERNAME = os.getenv("BLUESKY_USERNAME")
-BLUESKY_APP_PASSWORD = os.getenv("BLUESKY_APP_PASSWORD")
+# Account used when no account is passed, see accounts.py for credentials and templates
+DEFAULT_ACCOUNT = "hockey"
+
+# Maximum number of posts submitted in a single applyWrites call
+APPLY_WRITES_BATCH_SIZE = 10
+
+# Create a Bluesky session, returns a bluesky_client.Session or None
+def create_session(identifier, password):
+    from bluesky_client import login
+
+    return asyncio.run(login(identifier, password))
+
+# Refresh a session with its refresh token, returns the new Session or None
+def refresh_session(refresh_jwt):
+    from bluesky_client import refresh
+
+    return asyncio.run(refresh(refresh_jwt))
 
 # Authenticate with Bluesky API
-def authenticate():
-    auth_url = "https://bsky.social/xrpc/com.atproto.server.createSession"
-    auth_payload = {"identifier": BLUESKY_USERNAME, "password": BLUESKY_APP_PASSWORD}
-    
-    for attempt in range(3):
-        try:
-            auth_response = requests.post(auth_url, json=auth_payload, timeout=10)
-            auth_response.raise_for_status()
-            return auth_response.json()["accessJwt"]
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️ Authentication failed (attempt {attempt + 1}/3): {e}")
-            time.sleep(5)
-    
-    print("🚨 Authentication failed after 3 attempts. Exiting.")
-    exit()
+def authenticate(account=None):
+    account = account or get_account(DEFAULT_ACCOUNT)
+    access_token = account.get_access_token()
+    if access_token is None:
+        print("🚨 Authentication failed after 3 attempts. Exiting.")
+        exit()
+    return access_token
 
 # Fetch OpenGraph metadata
 def fetch_opengraph_metadata(url):
+    import requests
+    from bs4 import BeautifulSoup
+
     try:
         headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        response = download(url, headers=headers, timeout=10)
         
         soup = BeautifulSoup(response.text, "html.parser")
         
@@ -47,106 +60,91 @@ def fetch_opengraph_metadata(url):
         image_url = og_image["content"] if og_image else None
         
         return title, description, image_url
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, DownloadTooLarge) as e:
         print(f"⚠️ Failed to fetch metadata: {e}")
         return None, None, None
 
-# Upload image to Bluesky
-def upload_image(access_token, image_url):
+# Browser-like request headers for downloading an article image
+def image_request_headers(image_url):
+    # Special handling for SvenskaFans images
+    browser_headers = {
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+        "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.9"
+    }
+    
+    # Add specific referer for svenskafans images
+    if "svenskafans.com" in image_url:
+        print("Detected SvenskaFans image, using special headers...")
+        browser_headers["Referer"] = "https://www.svenskafans.com/"
+        browser_headers["Origin"] = "https://www.svenskafans.com"
+        browser_headers["sec-ch-ua"] = '"Chromium";v="122", "Google Chrome";v="122", "Not:A-Brand";v="99"'
+        browser_headers["sec-ch-ua-mobile"] = "?0"
+        browser_headers["sec-ch-ua-platform"] = '"macOS"'
+        browser_headers["Sec-Fetch-Dest"] = "image"
+        browser_headers["Sec-Fetch-Mode"] = "no-cors" 
+        browser_headers["Sec-Fetch-Site"] = "same-site"
+    return browser_headers
+
+# Download an image, returns (bytes, mime_type) or None
+def download_image(image_url):
+    import requests
+
     try:
-        # Special handling for SvenskaFans images
-        browser_headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-            "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-            "Accept-Language": "en-US,en;q=0.9"
-        }
+        browser_headers = image_request_headers(image_url)
         
-        # Add specific referer for svenskafans images
-        if "svenskafans.com" in image_url:
-            print("Detected SvenskaFans image, using special headers...")
-            browser_headers["Referer"] = "https://www.svenskafans.com/"
-            browser_headers["Origin"] = "https://www.svenskafans.com"
-            browser_headers["sec-ch-ua"] = '"Chromium";v="122", "Google Chrome";v="122", "Not:A-Brand";v="99"'
-            browser_headers["sec-ch-ua-mobile"] = "?0"
-            browser_headers["sec-ch-ua-platform"] = '"macOS"'
-            browser_headers["Sec-Fetch-Dest"] = "image"
-            browser_headers["Sec-Fetch-Mode"] = "no-cors" 
-            browser_headers["Sec-Fetch-Site"] = "same-site"
+        # Capped at the image limit even when the server sends something else
+        img_response = download(image_url, headers=browser_headers, timeout=10, max_bytes=max_bytes_for("image/"))
         
-        img_response = requests.get(image_url, headers=browser_headers, timeout=10)
-        img_response.raise_for_status()
-        
-        mime_type = img_response.headers['Content-Type']
-        print(f"Image MIME type: {mime_type}")
+        mime_type = img_response.content_type
+        print(f"Image MIME type: {mime_type} ({img_response.size} bytes)")
         if not mime_type.startswith('image/'):
             print(f"⚠️ Invalid MIME type: {mime_type}")
             return None
         
-        upload_url = "https://bsky.social/xrpc/com.atproto.repo.uploadBlob"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": mime_type
-        }
-        
-        upload_response = requests.post(upload_url, headers=headers, data=img_response.content)
-        upload_response.raise_for_status()
-        return upload_response.json()["blob"]
-    except requests.exceptions.RequestException as e:
-        print(f"⚠️ Failed to upload image: {e}")
-        # Continue without image
+        return img_response.content, mime_type
+    except (requests.exceptions.RequestException, DownloadTooLarge) as e:
+        print(f"⚠️ Failed to download image: {e}")
         return None
 
-# Post to Bluesky with link preview
-def post_to_bluesky(access_token, article_url, title=None, description=None, image_url=None):
+# Resolve an article's title, description and image once, so it can be posted
+# to several accounts without fetching them again for each one.
+# Returns (title, description, image), image is a (bytes, mime_type) pair or None.
+def prepare_article(article):
+    title, description, image_url = article.get("title"), article.get("description"), article.get("image_url")
+    if not (title and description):
+        title, description, fetched_image_url = fetch_opengraph_metadata(article["url"])
+        image_url = image_url or fetched_image_url
+    # Kept as bytes, the accounts upload it concurrently
+    image = download_image(image_url) if image_url else None
+    return title, description, image
+
+# Post to Bluesky with link preview.
+# Missing metadata is fetched from the article page. `image` is an already
+# downloaded (data, mime_type) pair, used when the same article is posted to
+# several accounts. `rkey` and `created_at` come from the outbox (see
+# outbox.assign_post_key), so a retry can't post the article twice.
+def post_to_bluesky(access_token, article_url, title=None, description=None, image_url=None, account=None, image=None,
+                    rkey=None, created_at=None):
+    from bluesky_client import post_single
+    
+    article = {"url": article_url, "title": title, "description": description, "image_url": image_url, "image": image,
+               "rkey": rkey, "created_at": created_at}
     try:
-        # If metadata isn't provided, fetch it from the URL
-        if not (title and description):
-            title, description, fetched_image_url = fetch_opengraph_metadata(article_url)
-            # Use the fetched image if none was provided
-            if not image_url and fetched_image_url:
-                image_url = fetched_image_url
-        
-        post_url = "https://bsky.social/xrpc/com.atproto.repo.createRecord"
-        headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-        
-        embed = {"$type": "app.bsky.embed.external", "external": {"uri": article_url, "title": title, "description": description}}
-        
-        if image_url:
-            blob = upload_image(access_token, image_url)
-            if blob:
-                embed["external"]["thumb"] = blob
-        
-        post_text = f"{title}\n\nDjurgården Hockey\n\n{article_url}"
-        post_payload = {
-            "repo": BLUESKY_USERNAME,
-            "collection": "app.bsky.feed.post",
-            "record": {
-                "text": post_text,
-                "embed": embed,
-                "facets": [{
-                    "$type": "app.bsky.richtext.facet",
-                    "index": {
-                        "start": post_text.find(article_url),
-                        "end": post_text.find(article_url) + len(article_url),
-                        "byteStart": post_text.encode().find(article_url.encode()),
-                        "byteEnd": post_text.encode().find(article_url.encode()) + len(article_url.encode())
-                    },
-                    "features": [{"$type": "app.bsky.richtext.facet.link", "uri": article_url}]
-                }],
-                "createdAt": datetime.datetime.utcnow().isoformat() + "Z"
-            }
-        }
-        
-        try:
-            post_response = requests.post(post_url, headers=headers, json=post_payload, timeout=10)
-            post_response.raise_for_status()
-            print(f"✅ Successfully posted: {title}")
-            return True
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️ Failed to post: {e}")
-            if e.response is not None:
-                print(f"Response content: {e.response.content}")
-            return False
+        return asyncio.run(post_single(account or get_account(DEFAULT_ACCOUNT), article, access_token))
     except Exception as e:
         print(f"⚠️ Failed to post: {e}")
         return False
+
+# Post several articles, submitting them in ordered applyWrites chunks.
+# Falls back to single createRecord calls, `post_delay` seconds apart, for a
+# chunk the server rejects. A chunk without a response stays queued, it may
+# already have been posted, and the articles' `rkey` makes sure the retry
+# doesn't post them again.
+# Returns the URLs of the articles that were posted, in posting order.
+def post_batch_to_bluesky(access_token, articles, account=None, post_delay=None):
+    from bluesky_client import DEFAULT_POST_DELAY_SECONDS, post_batch
+    
+    post_delay = DEFAULT_POST_DELAY_SECONDS if post_delay is None else post_delay
+    return asyncio.run(post_batch(account or get_account(DEFAULT_ACCOUNT), articles, access_token,
+                                  batch_size=APPLY_WRITES_BATCH_SIZE, post_delay=post_delay))
@@ -0,0 +1,31 @@
+from state_backend import load_state, update_state
+
+# URLs of the articles an account has posted, used to avoid posting the same
+# article twice. Stored through the state backend under the account's key,
+# e.g. posted_news.json.
+
+# Only the most recent posts are kept
+MAX_POSTED_NEWS = 100
+
+
+def load_posted_news(backend, key):
+    # Backend errors are not caught here: running without the posted list
+    # would post every article again
+    posted_news = load_state(backend, key, [])
+    if not isinstance(posted_news, list):
+        print(f"⚠️ Failed to load `{key}`, resetting it.")
+        return []
+    return posted_news
+
+
+def merge_posted_news(current, posted_news):
+    """Merge this run's posted list into the stored one, keeping URLs posted by a concurrent run as well."""
+    merged = current + [url for url in posted_news if url not in current]
+    return merged[-MAX_POSTED_NEWS:]
+
+
+def save_posted_news(backend, key, posted_news):
+    try:
+        update_state(backend, key, lambda current: merge_posted_news(current, posted_news), [])
+    except Exception as e:
+        print(f"⚠️ Failed to save `{key}`: {e}")
@@ -0,0 +1,92 @@
+import copy
+import datetime
+import json
+import sys
+import time
+from outbox import enqueue, drop_posted, due_items
+from post_record import build_record
+
+# Posting plans: what a run would post, without posting it.
+#
+# build_plan takes the fetched articles and the loaded posted list and outbox,
+# queues the new articles on a copy of the outbox and builds the exact post
+# record for every due item. Nothing is authenticated, uploaded, posted or
+# saved. Thumbnails are not uploaded, the image a post would use is listed as
+# `thumb_url` next to its record instead.
+#
+# With a fixed `now` the plan, including the records' createdAt, only depends
+# on the inputs, so it can be compared between runs.
+
+
+def plan_record(article, account, created_at=None):
+    """Build the record post_to_bluesky would create for an article, returns (record, image_url)."""
+    from post_to_bluesky import fetch_opengraph_metadata
+
+    title, description, image_url = article.get("title"), article.get("description"), article.get("image_url")
+    # Same metadata fallback as the posting code (bluesky_client._prepare_records)
+    if not (title and description):
+        title, description, fetched_image_url = fetch_opengraph_metadata(article["url"])
+        image_url = image_url or fetched_image_url
+    record = build_record(article["url"], title, description, template=account.template, created_at=created_at)
+    return record, image_url
+
+
+def build_plan(account, articles, posted_news, outbox, now=None):
+    """Return the posting plan for an account as a JSON-serialisable dict.
+
+    `articles` are the fetched articles in posting order. `posted_news` and
+    `outbox` are left untouched.
+    """
+    now = time.time() if now is None else now
+    created_at = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+    outbox = copy.deepcopy(outbox)
+
+    new_urls = set()
+    already_posted = []
+    for article in articles:
+        if article["url"] in posted_news:
+            already_posted.append(article["url"])
+        elif enqueue(outbox, dict(article), now):
+            new_urls.add(article["url"])
+
+    drop_posted(outbox, posted_news)
+    due = due_items(outbox, now)
+    due_urls = {item["url"] for item in due}
+    posts = []
+    for item in due:
+        # A retry reuses the createdAt and record key of its first attempt
+        first_attempt = item["article"].get("created_at")
+        record_created_at = created_at if first_attempt is None else datetime.datetime.fromtimestamp(first_attempt, datetime.timezone.utc)
+        record, image_url = plan_record(item["article"], account, record_created_at)
+        posts.append({
+            "url": item["url"],
+            "rkey": item["article"].get("rkey"),
+            "source": item["article"].get("source"),
+            "new": item["url"] in new_urls,
+            "attempt": item["attempts"] + 1,
+            "thumb_url": image_url,
+            "record": record
+        })
+
+    return {
+        "account": account.name,
+        "generated_at": now,
+        "posts": posts,
+        "waiting": [
+            {"url": item["url"], "attempts": item["attempts"], "next_attempt_at": item["next_attempt_at"]}
+            for item in outbox["pending"] if item["url"] not in due_urls
+        ],
+        "already_posted": already_posted,
+        "dead_letter": [item["url"] for item in outbox["dead_letter"]]
+    }
+
+
+def write_plan(plan, path="-"):
+    """Write a plan as JSON to `path`, or to stdout for "-"."""
+    text = json.dumps(plan, ensure_ascii=False, indent=2)
+    if path == "-":
+        sys.stdout.write(text + "\n")
+        return
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text + "\n")
+    print(f"📝 Plan with {len(plan['posts'])} posts written to {path}", file=sys.stderr)
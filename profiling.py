@@ -0,0 +1,287 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Profiling for a single fetcher run.
+#
+#   python news_fetcher.py --profile cprofile   # deterministic, writes profile.prof
+#   python news_fetcher.py --profile sample     # sampling, writes profile.folded
+#   python news_fetcher.py --fixtures --profile sample   # same, against fixtures/
+#
+# Both modes also time every HTTP call made through requests (DNS, TCP
+# connect, TLS handshake, time to first byte and body transfer), write the
+# calls to <output>-http.json and print summary tables when the run ends.
+#
+# The .folded file has one "frame;frame;frame count" line per stack and can be
+# fed to flamegraph.pl or opened in speedscope. The .prof file can be opened
+# with snakeviz or converted with flameprof.
+#
+# Calls made through the httpx transport (BLUESKY_TRANSPORT=httpx) are not
+# timed, they don't go through requests.
+
+DEFAULT_OUTPUT = "profile"
+
+# Interval between stack samples in sample mode
+SAMPLE_INTERVAL_SECONDS = 0.005
+
+# Rows printed in the summary tables
+SUMMARY_ROWS = 15
+
+
+class HttpTimer:
+    """Times the phases of each requests call by wrapping requests and urllib3 internals."""
+
+    def __init__(self):
+        self.calls = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._originals = []
+
+    def _current(self):
+        return getattr(self._local, "call", None)
+
+    def _add(self, phase, seconds):
+        call = self._current()
+        if call is not None:
+            call[phase] = call.get(phase, 0) + seconds
+
+    def _patch(self, owner, name, wrapper):
+        original = getattr(owner, name)
+        self._originals.append((owner, name, original))
+        setattr(owner, name, wrapper(original))
+
+    def install(self):
+        import socket
+        import requests
+        from urllib3.connection import HTTPConnection, HTTPSConnection
+
+        timer = self
+
+        def timed(phase):
+            def wrapper(original):
+                def call(*args, **kwargs):
+                    started = time.perf_counter()
+                    try:
+                        return original(*args, **kwargs)
+                    finally:
+                        timer._add(phase, time.perf_counter() - started)
+                return call
+            return wrapper
+
+        def timed_handshake(original):
+            # HTTPSConnection.connect opens the socket through _new_conn and
+            # then does the handshake, the TLS time is what remains
+            def connect(self, *args, **kwargs):
+                call = timer._current()
+                before = call.get("connect", 0) if call else 0
+                started = time.perf_counter()
+                try:
+                    return original(self, *args, **kwargs)
+                finally:
+                    if call is not None:
+                        elapsed = time.perf_counter() - started
+                        call["tls"] = call.get("tls", 0) + elapsed - (call.get("connect", 0) - before)
+            return connect
+
+        def timed_response(original):
+            def getresponse(self, *args, **kwargs):
+                response = original(self, *args, **kwargs)
+                call = timer._current()
+                if call is not None and "ttfb" not in call:
+                    call["ttfb"] = time.perf_counter() - call["_sent"]
+                return response
+            return getresponse
+
+        def timed_send(original):
+            def send(self, request, **kwargs):
+                call = {"method": request.method, "url": request.url, "_started": time.perf_counter()}
+                call["_sent"] = call["_started"]
+                timer._local.call = call
+                try:
+                    response = original(self, request, **kwargs)
+                except Exception as e:
+                    call["error"] = type(e).__name__
+                    timer._finish(call)
+                    raise
+                finally:
+                    timer._local.call = None
+
+                call["status"] = response.status_code
+                call["_headers"] = time.perf_counter()
+                if kwargs.get("stream"):
+                    # The body is read later, the call ends when the response is closed
+                    close = response.close
+
+                    def close_and_finish():
+                        close()
+                        timer._finish(call)
+                    response.close = close_and_finish
+                else:
+                    timer._finish(call)
+                return response
+            return send
+
+        self._patch(socket, "getaddrinfo", timed("dns"))
+        self._patch(HTTPConnection, "_new_conn", timed("connect"))
+        self._patch(HTTPSConnection, "connect", timed_handshake)
+        self._patch(HTTPConnection, "getresponse", timed_response)
+        self._patch(requests.Session, "send", timed_send)
+
+    def uninstall(self):
+        while self._originals:
+            owner, name, original = self._originals.pop()
+            setattr(owner, name, original)
+
+    def _finish(self, call):
+        if "_started" not in call:
+            return  # Already finished, close() can be called more than once
+        finished = time.perf_counter()
+        started = call.pop("_started")
+        sent = call.pop("_sent")
+        headers = call.pop("_headers", finished)
+        # The connection phases come before the request is sent
+        call["dns"] = call.get("dns", 0)
+        call["connect"] = max(call.get("connect", 0) - call["dns"], 0)
+        call["tls"] = call.get("tls", 0)
+        call["ttfb"] = call.get("ttfb", headers - sent) - call["dns"] - call["connect"] - call["tls"]
+        call["transfer"] = finished - headers
+        call["total"] = finished - started
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self):
+        lines = [f"{'method':<6} {'status':>6} {'dns':>7} {'connect':>7} {'tls':>7} {'ttfb':>7} {'transfer':>8} {'total':>7}  url"]
+        for call in sorted(self.calls, key=lambda call: call["total"], reverse=True)[:SUMMARY_ROWS]:
+            lines.append(
+                f"{call['method']:<6} {call.get('status', call.get('error', '-'))!s:>6} "
+                + " ".join(f"{call[phase] * 1000:>{width}.1f}" for phase, width in
+                           (("dns", 7), ("connect", 7), ("tls", 7), ("ttfb", 7), ("transfer", 8), ("total", 7)))
+                + f"  {call['url']}"
+            )
+        total = sum(call["total"] for call in self.calls)
+        lines.append(f"{len(self.calls)} HTTP calls, {total * 1000:.1f} ms in total (times in ms)")
+        return "\n".join(lines)
+
+
+class StackSampler:
+    """Samples the stacks of all threads on a background thread, for flamegraphs."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path):
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+    def summary(self):
+        # Self samples (the function was running) and inclusive samples (it
+        # was on the stack, counted once per stack)
+        total = sum(self.stacks.values()) or 1
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if frames:
+                own[frames[-1]] += count
+            for name in set(frames):
+                inclusive[name] += count
+        lines = [f"{'self':>6} {'total':>6}  function"]
+        for name, count in own.most_common(SUMMARY_ROWS):
+            lines.append(f"{count / total:>6.1%} {inclusive[name] / total:>6.1%}  {name}")
+        lines.append(f"{total} samples every {self.interval * 1000:.0f} ms")
+        return "\n".join(lines)
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", choices=["cprofile", "sample"],
+                        help="profile the run and print where the time went")
+    parser.add_argument("--profile-output", default=DEFAULT_OUTPUT,
+                        help=f"path prefix for the profile files (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--fixtures", nargs="?", const="", metavar="DIR",
+                        help="serve HTTP from recorded fixtures instead of the network, "
+                             "state is kept in memory unless STATE_BACKEND is set")
+
+
+def setup_fixtures(args):
+    """Install the fixtures requested with --fixtures, returns True if they are used."""
+    if args.fixtures is None:
+        return False
+    from fixtures import FIXTURES_DIR, install_fixtures
+
+    install_fixtures(args.fixtures or FIXTURES_DIR)
+    # Don't let an offline run touch the real state files
+    os.environ.setdefault("STATE_BACKEND", "memory")
+    return True
+
+
+def run_with_profile(args, func):
+    """Run `func()` under the profiler selected by --profile and report the results."""
+    if not args.profile:
+        return func()
+
+    timer = HttpTimer()
+    timer.install()
+    started = time.perf_counter()
+    try:
+        if args.profile == "cprofile":
+            import cProfile
+            import pstats
+
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func)
+            finally:
+                path = f"{args.profile_output}.prof"
+                profiler.dump_stats(path)
+                print(f"\n📊 cProfile: {time.perf_counter() - started:.2f} s, written to {path}")
+                pstats.Stats(profiler).sort_stats("cumulative").print_stats(SUMMARY_ROWS)
+
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            return func()
+        finally:
+            sampler.stop()
+            path = f"{args.profile_output}.folded"
+            sampler.write_folded(path)
+            print(f"\n📊 Sampled profile: {time.perf_counter() - started:.2f} s, folded stacks written to {path}")
+            print(sampler.summary())
+    finally:
+        timer.uninstall()
+        path = f"{args.profile_output}-http.json"
+        with open(path, "w") as file:
+            json.dump(timer.calls, file, indent=2)
+        print(f"\n🌐 HTTP calls, written to {path}")
+        print(timer.summary())
@@ -3,8 +3,8 @@ import json
 import os
 from dotenv import load_dotenv
 import feedparser
-import datetime
 from bs4 import BeautifulSoup
+from post_record import build_facets, format_created_at
 
 # Load environment variables from a .env file
 load_dotenv()
@@ -54,23 +54,8 @@ def save_posted_news(posted_news):
     with open("posted_news.json", "w") as file:
         json.dump(posted_news, file)
 
-# Fetch and parse the RSS feed
+# RSS feed with the news to post
 RSS_FEED_URL = "https://www.svenskafans.com/rss/team/251"
-feed = feedparser.parse(requests.get(RSS_FEED_URL).text)
-
-if not feed.entries:
-    print("🚨 No news found! Exiting.")
-    exit()
-
-latest_entry = feed.entries[0]
-title = latest_entry.title
-link = latest_entry.link
-
-# Check if the news has already been posted
-posted_news = load_posted_news()
-if link in posted_news:
-    print("ℹ️ News has already been posted. Exiting.")
-    exit()
 
 # Fetch embed URL card
 def fetch_embed_url_card(access_token: str, url: str) -> dict:
@@ -128,6 +113,23 @@ def fetch_embed_url_card(access_token: str, url: str) -> dict:
         "external": card,
     }
 
+# Build the post text and its facets
+def build_post(title, link):
+    """
+    Build the post text for a news article and its link and hashtag facets.
+    
+    Args:
+        title (str): The title of the news article.
+        link (str): The link to the news article.
+    
+    Returns:
+        tuple: The post text and its facets.
+    """
+    post_text = f"{title}\n\n{link}\n\n#DIFhockey"
+    
+    # Byte offsets must be counted in UTF-8, titles often contain å/ä/ö
+    return post_text, build_facets(post_text, links=(link,))
+
 # Create a Bluesky post with a clickable hyperlink and website card embed
 def post_to_bluesky(access_token, title, link):
     """
@@ -141,18 +143,7 @@ def post_to_bluesky(access_token, title, link):
     post_url = "https://bsky.social/xrpc/com.atproto.repo.createRecord"
     headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
     
-    post_text = f"{title}\n\n{link}\n\n#DIFhockey"
-    
-    facets = [{
-        "index": {
-            "byteStart": len(title) + 2,
-            "byteEnd": len(title) + 2 + len(link)
-        },
-        "features": [{
-            "$type": "app.bsky.richtext.facet#link",
-            "uri": link
-        }]
-    }]
+    post_text, facets = build_post(title, link)
     
     embed = fetch_embed_url_card(access_token, link)
     
@@ -162,7 +153,7 @@ def post_to_bluesky(access_token, title, link):
         "record": {
             "text": post_text,
             "facets": facets,
-            "createdAt": datetime.datetime.utcnow().isoformat() + "Z",
+            "createdAt": format_created_at(),
             "embed": embed
         }
     }
@@ -178,5 +169,23 @@ def post_to_bluesky(access_token, title, link):
         print(f"⚠️ Failed to post: {post_response.text}")
 
 # Execute the script
-access_token = authenticate()
-post_to_bluesky(access_token, title, link)
+if __name__ == "__main__":
+    # Fetch and parse the RSS feed
+    feed = feedparser.parse(requests.get(RSS_FEED_URL).text)
+    
+    if not feed.entries:
+        print("🚨 No news found! Exiting.")
+        exit()
+    
+    latest_entry = feed.entries[0]
+    title = latest_entry.title
+    link = latest_entry.link
+    
+    # Check if the news has already been posted
+    posted_news = load_posted_news()
+    if link in posted_news:
+        print("ℹ️ News has already been posted. Exiting.")
+        exit()
+    
+    access_token = authenticate()
+    post_to_bluesky(access_token, title, link)
@@ -0,0 +1,199 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+
+# Pluggable storage for the fetchers' state (posted news, outbox, host health).
+#
+# Every backend stores JSON documents under a key and supports optimistic
+# concurrency: `load` returns the value together with an opaque version, and
+# `compare_and_swap` only writes when the stored version is still the one that
+# was loaded. `update_state` retries a read-modify-write until it succeeds, so
+# two jobs writing the same key can't silently overwrite each other.
+#
+# Select a backend with the STATE_BACKEND environment variable:
+#   file    JSON files in STATE_DIR (default, same files as before). The lock
+#           only covers runs on the same machine, CI runs in separate checkouts
+#           still rely on the workflow pushing the files back
+#   sqlite  a single SQLite database at STATE_SQLITE_PATH
+#   s3      objects in STATE_S3_BUCKET under STATE_S3_PREFIX, using conditional
+#           writes (any S3-compatible store via STATE_S3_ENDPOINT, needs boto3)
+#   memory  in-process dictionary, a local stand-in for tests and dry runs
+
+
+class FileStateBackend:
+    """JSON files in a directory, versioned by content hash and locked with flock."""
+
+    def __init__(self, directory="."):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _read(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None, None
+        with open(path, "rb") as file:
+            data = file.read()
+        version = hashlib.sha1(data).hexdigest()
+        try:
+            return json.loads(data), version
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            print(f"⚠️ Failed to load `{key}`, resetting it.")
+            return None, version
+
+    def load(self, key):
+        return self._read(key)
+
+    def compare_and_swap(self, key, value, expected_version):
+        import fcntl
+
+        path = self._path(key)
+        with open(path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            _, version = self._read(key)
+            if version != expected_version:
+                return False
+            tmp_path = path + ".tmp"
+            try:
+                # Not the locale encoding, titles like "Djurgården" must save everywhere
+                with open(tmp_path, "w", encoding="utf-8") as file:
+                    json.dump(value, file, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            return True
+
+
+class SQLiteStateBackend:
+    """All keys in one SQLite table with an integer version per key."""
+
+    def __init__(self, path="state.sqlite3"):
+        import sqlite3
+
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, version INTEGER NOT NULL)"
+            )
+
+    def load(self, key):
+        row = self.connection.execute("SELECT value, version FROM state WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def compare_and_swap(self, key, value, expected_version):
+        data = json.dumps(value, ensure_ascii=False)
+        with self.connection:
+            if expected_version is None:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO state (key, value, version) VALUES (?, ?, 1)", (key, data)
+                )
+            else:
+                cursor = self.connection.execute(
+                    "UPDATE state SET value = ?, version = version + 1 WHERE key = ? AND version = ?",
+                    (data, key, expected_version)
+                )
+        return cursor.rowcount == 1
+
+
+class S3StateBackend:
+    """Objects in an S3-compatible bucket, versioned by ETag with conditional PUTs."""
+
+    def __init__(self, bucket, prefix="", endpoint_url=None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("STATE_BACKEND=s3 needs boto3, install it with `pip install boto3`")
+
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def load(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.client.exceptions.NoSuchKey:
+            return None, None
+        return json.loads(response["Body"].read()), response["ETag"]
+
+    def compare_and_swap(self, key, value, expected_version):
+        from botocore.exceptions import ClientError
+
+        conditions = {"IfNoneMatch": "*"} if expected_version is None else {"IfMatch": expected_version}
+        try:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self.prefix + key,
+                Body=json.dumps(value, ensure_ascii=False).encode("utf-8"),
+                ContentType="application/json",
+                **conditions
+            )
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return False
+            raise
+
+
+class MemoryStateBackend:
+    """In-process stand-in with the same semantics as the persistent backends."""
+
+    def __init__(self, initial=None):
+        self.lock = threading.Lock()
+        self.values = {key: (copy.deepcopy(value), 1) for key, value in (initial or {}).items()}
+
+    def load(self, key):
+        with self.lock:
+            value, version = self.values.get(key, (None, None))
+            return copy.deepcopy(value), version
+
+    def compare_and_swap(self, key, value, expected_version):
+        with self.lock:
+            _, version = self.values.get(key, (None, None))
+            if version != expected_version:
+                return False
+            self.values[key] = (copy.deepcopy(value), (version or 0) + 1)
+            return True
+
+
+def get_state_backend():
+    kind = os.getenv("STATE_BACKEND", "file").lower()
+    if kind == "file":
+        return FileStateBackend(os.getenv("STATE_DIR", "."))
+    if kind == "sqlite":
+        return SQLiteStateBackend(os.getenv("STATE_SQLITE_PATH", "state.sqlite3"))
+    if kind == "s3":
+        return S3StateBackend(
+            os.environ["STATE_S3_BUCKET"],
+            prefix=os.getenv("STATE_S3_PREFIX", ""),
+            endpoint_url=os.getenv("STATE_S3_ENDPOINT") or None
+        )
+    if kind == "memory":
+        return MemoryStateBackend()
+    raise ValueError(f"Unknown STATE_BACKEND: {kind}")
+
+
+def load_state(backend, key, default):
+    value, _ = backend.load(key)
+    return default if value is None else value
+
+
+def update_state(backend, key, update, default, retries=5):
+    """Apply `update(current_value)` to a key with compare-and-swap, retrying on conflicts.
+
+    `update` must be safe to call several times, it is re-run on the freshly
+    loaded value after each conflict. Returns the stored value.
+    """
+    for attempt in range(retries):
+        current, version = backend.load(key)
+        value = update(copy.deepcopy(default) if current is None else current)
+        if backend.compare_and_swap(key, value, version):
+            return value
+        print(f"⚠️ `{key}` was changed by another run, retrying ({attempt + 1}/{retries})")
+    raise RuntimeError(f"Could not update `{key}` after {retries} attempts")
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from accounts import get_account, post_concurrently
+from host_health import load_host_health, save_host_health
+from posted_news import load_posted_news, save_posted_news
+from outbox import load_outbox, save_outbox, enqueue, drop_posted, due_items, settle_outbox, assign_post_key
+from post_to_bluesky import post_to_bluesky, prepare_article
+from state_backend import get_state_backend
+import news_fetcher
+import news_fetcher_diffotboll
+
+# Fetch-once fan-out for several accounts.
+#
+# Each account subscribes to a list of sources. A cycle fetches and enriches
+# every subscribed source exactly once, then hands the articles to each
+# subscriber's own dedup list and outbox, and finally posts the due articles
+# for all accounts concurrently. An article's metadata and image are fetched
+# once per cycle and shared by every account posting it, only the upload is
+# per account. Upstream requests grow with the number of sources, not
+# sources times accounts.
+#
+# Subscriptions can be replaced with the BLUESKY_SUBSCRIPTIONS environment
+# variable, a JSON object mapping account names to lists of source names.
+#
+# Usage: python subscriptions.py [account ...] [--profile cprofile|sample] [--fixtures [DIR]]
+
+# Source name -> fetch function taking (skip_urls, host_health)
+SOURCES = {
+    "dif_hockey": lambda skip_urls, host_health: news_fetcher.fetch_dif_hockey_news(host_health),
+    "svenskafans_hockey": news_fetcher.fetch_svenskafans_rss_news,
+    "dif_fotboll": lambda skip_urls, host_health: news_fetcher_diffotboll.fetch_dif_fotboll_news(host_health),
+    "svenskafans_fotboll": news_fetcher_diffotboll.fetch_svenskafans_rss_news,
+}
+
+SUBSCRIPTIONS = {
+    "hockey": ["dif_hockey", "svenskafans_hockey"],
+    "football": ["dif_fotboll", "svenskafans_fotboll"],
+}
+
+# Host health is shared by every account, the sources are fetched once for all of them
+HOST_HEALTH_KEY = "host_health.json"
+
+
+def subscriptions():
+    subscriptions = dict(SUBSCRIPTIONS)
+    extra = os.getenv("BLUESKY_SUBSCRIPTIONS")
+    if extra:
+        try:
+            subscriptions.update(json.loads(extra))
+        except json.JSONDecodeError as e:
+            print(f"⚠️ Ignoring invalid BLUESKY_SUBSCRIPTIONS: {e}")
+    return subscriptions
+
+
+def fetch_sources(source_names, skip_urls, host_health):
+    """Fetch each source once. `skip_urls` maps a source to URLs none of its subscribers needs."""
+    articles = {}
+    for name in source_names:
+        articles[name] = SOURCES[name](list(skip_urls.get(name, ())), host_health)
+        print(f"📥 {name}: {len(articles[name])} articles")
+    return articles
+
+
+def run_cycle(account_names=None, backend=None, max_workers=4):
+    backend = backend or get_state_backend()
+    graph = subscriptions()
+    accounts = [get_account(name) for name in (account_names or graph)]
+
+    posted_news = {account: load_posted_news(backend, account.posted_news_key) for account in accounts}
+    outboxes = {account: load_outbox(backend, account.outbox_key) for account in accounts}
+    host_health = load_host_health(backend, HOST_HEALTH_KEY)
+
+    # A source's article page only needs scraping if some subscriber hasn't
+    # posted or queued it yet
+    skip_urls = {}
+    for account in accounts:
+        outbox = outboxes[account]
+        known = set(posted_news[account]) | {item["url"] for item in outbox["pending"] + outbox["dead_letter"]}
+        for source in graph.get(account.name, []):
+            skip_urls[source] = skip_urls[source] & known if source in skip_urls else known
+
+    fetched = fetch_sources(list(skip_urls), skip_urls, host_health)
+    save_host_health(backend, HOST_HEALTH_KEY, host_health)
+
+    # Fan out: every subscriber gets its own copy in its own outbox
+    for account in accounts:
+        articles = [article for source in graph.get(account.name, []) for article in fetched.get(source, [])]
+        articles.sort(key=lambda x: x["timestamp"])
+        for article in articles:
+            if article["url"] not in posted_news[account] and enqueue(outboxes[account], dict(article)):
+                print(f"Queued {article['source']} article for {account.name}: {article['url']}")
+        # Saved before posting so the queued articles survive a crash
+        drop_posted(outboxes[account], posted_news[account])
+        save_outbox(backend, account.outbox_key, outboxes[account], posted_news[account])
+
+    now = time.time()
+    due = {account: due_items(outboxes[account], now) for account in accounts}
+    attempted = {account: set() for account in accounts}
+
+    # Article URL -> (title, description, image), filled by the first account
+    # that posts the article
+    prepared = {}
+    prepare_locks = defaultdict(threading.Lock)
+    prepare_locks_lock = threading.Lock()
+
+    def prepare(article):
+        with prepare_locks_lock:
+            lock = prepare_locks[article["url"]]
+        with lock:
+            if article["url"] not in prepared:
+                prepared[article["url"]] = prepare_article(article)
+            return prepared[article["url"]]
+
+    def send(account, article):
+        attempted[account].add(article["url"])
+        access_token = account.get_access_token()
+        if access_token is None:
+            return False
+        title, description, image = prepare(article)
+        # Stored on the outbox item, retries reuse the record key
+        assign_post_key(article)
+        return post_to_bluesky(
+            access_token,
+            article["url"],
+            title=title,
+            description=description,
+            account=account,
+            image=image,
+            rkey=article["rkey"],
+            created_at=article["created_at"]
+        )
+
+    posted = post_concurrently(
+        {account: [item["article"] for item in items] for account, items in due.items()},
+        send,
+        max_workers=max_workers
+    )
+
+    for account in accounts:
+        posted_urls = posted.get(account.name, [])
+        # Articles held back by the rate budget were not tried and keep their schedule
+        tried = [item for item in due[account] if item["url"] in attempted[account]]
+        settle_outbox(outboxes[account], tried, posted_urls, now)
+        posted_news[account].extend(posted_urls)
+        save_posted_news(backend, account.posted_news_key, posted_news[account])
+        save_outbox(backend, account.outbox_key, outboxes[account], posted_news[account])
+        print(f"✅ {account.name}: posted {len(posted_urls)} of {len(due[account])} due articles")
+
+
+def main():
+    import argparse
+    from profiling import add_profile_arguments, setup_fixtures, run_with_profile
+
+    parser = argparse.ArgumentParser(description="Fetch every subscribed source once and post for each account.")
+    parser.add_argument("accounts", nargs="*", help="accounts to run (default: all subscribed accounts)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    setup_fixtures(args)
+    run_with_profile(args, lambda: run_cycle(args.accounts or None))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import asyncio
+import io
+import json
+
+import post_to_bluesky
+from accounts import Account
+from bluesky_client import Response, Session, post_batch, post_single
+
+
+class FakeTransport:
+    """Answers XRPC calls in memory and records them.
+
+    `replies` maps an NSID to (status, body) pairs returned before the
+    default successful reply.
+    """
+
+    name = "fake"
+
+    def __init__(self, replies=None, image=None):
+        self.replies = {nsid: list(answers) for nsid, answers in (replies or {}).items()}
+        self.image = image
+        self.calls = []
+        self.uploads = []
+
+    async def request(self, method, url, headers=None, payload=None, content=None, timeout=None):
+        nsid = url.rsplit("/", 1)[-1].split("?")[0]
+        self.calls.append((nsid, (headers or {}).get("Authorization"), payload))
+        if nsid == "com.atproto.repo.uploadBlob":
+            self.uploads.append(content.read() if hasattr(content, "read") else content)
+        if self.replies.get(nsid):
+            status, body = self.replies[nsid].pop(0)
+            return Response(status, {}, json.dumps(body).encode())
+        if nsid == "com.atproto.repo.applyWrites":
+            body = {"results": [{"uri": f"at://did/app.bsky.feed.post/{i}", "cid": "cid"} for i in range(len(payload["writes"]))]}
+        elif nsid == "com.atproto.repo.uploadBlob":
+            body = {"blob": {"$type": "blob", "ref": {"$link": "blob"}, "mimeType": "image/png", "size": 3}}
+        else:
+            body = {"uri": "at://did/app.bsky.feed.post/1", "cid": "cid"}
+        return Response(200, {}, json.dumps(body).encode())
+
+    async def download(self, url, headers=None, max_bytes=None, spool=False):
+        if self.image is None:
+            return Response(404, {}, b"")
+        return Response(200, {"Content-Type": "image/png"}, io.BytesIO(self.image) if spool else self.image)
+
+    async def close(self):
+        pass
+
+    def nsids(self):
+        return [nsid for nsid, _, _ in self.calls]
+
+
+def account():
+    return Account("test", "test.bsky.social", "password", "{title}\n\n{url}")
+
+
+def article(url="https://example.com/ok", **fields):
+    return dict({"url": url, "title": "Djurgården vann", "description": "Matchen"}, **fields)
+
+
+def test_post_batch_skips_an_article_that_cant_be_prepared(monkeypatch):
+    def fetch_opengraph_metadata(url):
+        # A meta tag without content
+        raise KeyError("content")
+
+    monkeypatch.setattr(post_to_bluesky, "fetch_opengraph_metadata", fetch_opengraph_metadata)
+    transport = FakeTransport()
+    articles = [{"url": "https://example.com/broken"}, article()]
+
+    posted = asyncio.run(post_batch(account(), articles, access_token="token", transport=transport))
+
+    assert posted == ["https://example.com/ok"]
+    (nsid, _, payload), = transport.calls
+    assert nsid == "com.atproto.repo.applyWrites"
+    assert [write["value"]["embed"]["external"]["uri"] for write in payload["writes"]] == ["https://example.com/ok"]
+
+
+def test_post_batch_falls_back_to_single_posts_when_rejected():
+    transport = FakeTransport({"com.atproto.repo.applyWrites": [(400, {"error": "InvalidRequest"})]})
+    articles = [article("https://example.com/1"), article("https://example.com/2")]
+
+    posted = asyncio.run(post_batch(account(), articles, access_token="token", transport=transport, post_delay=0))
+
+    assert posted == ["https://example.com/1", "https://example.com/2"]
+    assert transport.nsids() == ["com.atproto.repo.applyWrites"] + ["com.atproto.repo.createRecord"] * 2
+
+
+def test_post_batch_leaves_a_chunk_without_response_queued():
+    class TimeoutTransport(FakeTransport):
+        async def request(self, method, url, **kwargs):
+            await super().request(method, url, **kwargs)
+            raise TimeoutError("read timed out")
+
+    transport = TimeoutTransport()
+
+    posted = asyncio.run(post_batch(account(), [article()], access_token="token", transport=transport))
+
+    assert posted == []
+    assert transport.nsids() == ["com.atproto.repo.applyWrites"]
+
+
+def test_expired_token_is_renewed_through_the_account(monkeypatch):
+    refreshed = []
+
+    def refresh_session(refresh_jwt):
+        refreshed.append(refresh_jwt)
+        return Session(None, None, "new-token", "new-refresh")
+
+    monkeypatch.setattr(post_to_bluesky, "refresh_session", refresh_session)
+    test_account = account()
+    test_account.access_token, test_account.refresh_jwt = "old-token", "refresh"
+    transport = FakeTransport({"com.atproto.repo.createRecord": [(400, {"error": "ExpiredToken"})]})
+
+    assert asyncio.run(post_single(test_account, article(), transport=transport))
+
+    assert refreshed == ["refresh"]
+    assert [authorization for _, authorization, _ in transport.calls] == ["Bearer old-token", "Bearer new-token"]
+    assert (test_account.access_token, test_account.refresh_jwt) == ("new-token", "new-refresh")
+
+
+def test_thumbnail_is_uploaded_from_the_spooled_download():
+    transport = FakeTransport(image=b"png")
+
+    assert asyncio.run(post_single(account(), article(image_url="https://example.com/image.png"), "token", transport))
+
+    assert transport.uploads == [b"png"]
+    _, _, payload = transport.calls[-1]
+    assert payload["record"]["embed"]["external"]["thumb"]["ref"] == {"$link": "blob"}
+
+
+def test_post_batch_sends_the_record_keys_and_created_at():
+    transport = FakeTransport()
+    articles = [article("https://example.com/1", rkey="3kabc", created_at=0), article("https://example.com/2")]
+
+    asyncio.run(post_batch(account(), articles, access_token="token", transport=transport))
+
+    (_, _, payload), = transport.calls
+    first, second = payload["writes"]
+    assert first["rkey"] == "3kabc"
+    assert first["value"]["createdAt"] == "1970-01-01T00:00:00.000Z"
+    assert "rkey" not in second
+
+
+def test_replayed_batch_counts_records_already_created_as_posted():
+    # The first applyWrites was committed but its response was lost. The
+    # retry is rejected, and the single posts find the first record by its key.
+    transport = FakeTransport({
+        "com.atproto.repo.applyWrites": [(400, {"error": "InvalidRequest", "message": "Record already exists"})],
+        "com.atproto.repo.createRecord": [(400, {"error": "InvalidRequest", "message": "Record already exists"})],
+        "com.atproto.repo.getRecord": [(200, {"uri": "at://did/app.bsky.feed.post/3kabc"})],
+    })
+    articles = [article("https://example.com/1", rkey="3kabc"), article("https://example.com/2", rkey="3kabd")]
+
+    posted = asyncio.run(post_batch(account(), articles, access_token="token", transport=transport, post_delay=0))
+
+    assert posted == ["https://example.com/1", "https://example.com/2"]
+    assert transport.nsids() == [
+        "com.atproto.repo.applyWrites",
+        "com.atproto.repo.createRecord",
+        "com.atproto.repo.getRecord",
+        "com.atproto.repo.createRecord",
+    ]
+    _, _, payload = transport.calls[3]
+    assert payload["rkey"] == "3kabd"
+
+
+def test_rejected_post_without_a_stored_record_fails():
+    transport = FakeTransport({
+        "com.atproto.repo.createRecord": [(400, {"error": "InvalidRequest"})],
+        "com.atproto.repo.getRecord": [(400, {"error": "RecordNotFound"})],
+    })
+
+    assert not asyncio.run(post_single(account(), article(rkey="3kabc"), "token", transport))
+
+
+def test_batch_fallback_waits_post_delay_between_single_posts(monkeypatch):
+    import bluesky_client
+
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(bluesky_client.asyncio, "sleep", sleep)
+    transport = FakeTransport({"com.atproto.repo.applyWrites": [(400, {"error": "InvalidRequest"})]})
+    articles = [article(f"https://example.com/{i}") for i in range(3)]
+
+    asyncio.run(post_batch(account(), articles, access_token="token", transport=transport, post_delay=0.5))
+
+    assert delays == [0.5, 0.5]
@@ -0,0 +1,134 @@
+import calendar
+import time
+
+import feedparser
+
+from feed_reader import iter_entries, parse_date, read_entries
+
+RSS_ITEM = """<item>
+  <title>Nyhet {i}</title>
+  <link>https://www.svenskafans.com/ishockey/nyhet-{i}</link>
+  <pubDate>Sun, 02 Mar 2025 {hour:02d}:00:00 +0100</pubDate>
+</item>"""
+
+
+def rss(items, extra=""):
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel><title>SvenskaFans</title>'
+        f"{items}</channel></rss>{extra}"
+    ).encode("utf-8")
+
+
+def numbered_feed(count):
+    # Newest first, like the real feeds
+    return rss("".join(RSS_ITEM.format(i=i, hour=20 - i) for i in range(count)))
+
+
+def test_rss_text_links():
+    entries = read_entries(numbered_feed(2))
+
+    assert [entry.link for entry in entries] == [
+        "https://www.svenskafans.com/ishockey/nyhet-0",
+        "https://www.svenskafans.com/ishockey/nyhet-1",
+    ]
+    assert entries[0].title == "Nyhet 0"
+
+
+def test_atom_alternate_link():
+    feed = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>DIF</title>
+  <entry>
+    <title>Djurg\xc3\xa5rden vann</title>
+    <link rel="self" href="https://example.com/feed/1"/>
+    <link rel="alternate" href="https://example.com/nyheter/1"/>
+    <updated>2025-03-02T18:00:00+01:00</updated>
+  </entry>
+  <entry>
+    <title>Utan rel</title>
+    <link href="https://example.com/nyheter/2"/>
+  </entry>
+</feed>"""
+
+    entries = read_entries(feed)
+
+    assert [entry.link for entry in entries] == ["https://example.com/nyheter/1", "https://example.com/nyheter/2"]
+    assert entries[0].title == "Djurgården vann"
+    assert calendar.timegm(entries[0].published_parsed) == calendar.timegm((2025, 3, 2, 17, 0, 0))
+
+
+def test_guid_permalink_when_there_is_no_link():
+    feed = rss('<item><title>A</title><guid>https://example.com/a</guid></item>'
+               '<item><title>B</title><guid isPermaLink="false">b-123</guid></item>')
+
+    assert [entry.link for entry in read_entries(feed)] == ["https://example.com/a"]
+
+
+def test_limit_stops_before_the_rest_of_the_feed_is_parsed():
+    # Everything after the first items is broken, reading stops before it
+    feed = numbered_feed(3)[:-len(b"</channel></rss>")] + b"<item><title>&nbsp;</title></broken>"
+
+    entries = list(iter_entries(feed, limit=2))
+
+    assert [entry.title for entry in entries] == ["Nyhet 0", "Nyhet 1"]
+
+
+def test_watermark_stops_at_the_first_older_entry():
+    watermark = calendar.timegm((2025, 3, 2, 18, 0, 0))  # Nyhet 1 at 19:00 +0100
+
+    entries = read_entries(numbered_feed(5), watermark=watermark)
+
+    assert [entry.title for entry in entries] == ["Nyhet 0"]
+
+
+def test_zero_limit_reads_nothing():
+    assert read_entries(numbered_feed(3), limit=0) == []
+
+
+def test_malformed_feed_falls_back_to_feedparser():
+    # &nbsp; is an HTML entity, not valid in XML
+    feed = rss("<item><title>Djurgården&nbsp;vann</title><link>https://example.com/a</link>"
+               "<enclosure url=\"https://example.com/a.jpg\" type=\"image/jpeg\"/></item>")
+
+    entries = read_entries(feed, limit=3)
+
+    assert [entry.link for entry in entries] == ["https://example.com/a"]
+    assert entries[0].title == "Djurgården\xa0vann"
+    assert entries[0].image_url == "https://example.com/a.jpg"
+
+
+def test_enclosure_image():
+    feed = rss('<item><link>https://example.com/a</link>'
+               '<enclosure url="https://example.com/a.mp3" type="audio/mpeg"/>'
+               '<enclosure url="https://example.com/a.jpg" type="image/jpeg"/></item>')
+
+    assert read_entries(feed)[0].image_url == "https://example.com/a.jpg"
+
+
+def test_media_content_and_thumbnail_images():
+    feed = rss('<item><link>https://example.com/a</link>'
+               '<media:content url="https://example.com/a.mp4" medium="video"/>'
+               '<media:content url="https://example.com/a.png" medium="image"/></item>'
+               '<item><link>https://example.com/b</link>'
+               '<media:thumbnail url="https://example.com/b.jpg"/></item>'
+               '<item><link>https://example.com/c</link></item>')
+
+    assert [entry.image_url for entry in read_entries(feed)] == ["https://example.com/a.png", "https://example.com/b.jpg", None]
+
+
+def test_dates_match_feedparser():
+    feed = numbered_feed(1)
+
+    ours = read_entries(feed)[0].published_parsed
+    theirs = feedparser.parse(feed).entries[0].published_parsed
+
+    assert tuple(ours) == tuple(theirs)
+    assert time.mktime(ours) == time.mktime(theirs)
+
+
+def test_parse_date():
+    assert calendar.timegm(parse_date("Sun, 02 Mar 2025 20:00:00 +0100")) == calendar.timegm((2025, 3, 2, 19, 0, 0))
+    assert calendar.timegm(parse_date("2025-03-02T20:00:00Z")) == calendar.timegm((2025, 3, 2, 20, 0, 0))
+    assert parse_date("igår") is None
+    assert parse_date("") is None
@@ -0,0 +1,54 @@
+from outbox import MAX_ATTEMPTS, drain_outbox, empty_outbox, enqueue
+
+
+def crashing_send(articles):
+    raise KeyError("content")
+
+
+def test_drain_outbox_backs_off_when_send_raises():
+    outbox = empty_outbox()
+    enqueue(outbox, {"url": "a"}, now=0)
+    enqueue(outbox, {"url": "b"}, now=0)
+
+    assert drain_outbox(outbox, crashing_send, now=0) == []
+
+    assert [item["attempts"] for item in outbox["pending"]] == [1, 1]
+    assert all(item["next_attempt_at"] > 0 for item in outbox["pending"])
+
+
+def test_drain_outbox_dead_letters_an_item_that_keeps_crashing_send():
+    outbox = empty_outbox()
+    enqueue(outbox, {"url": "a"}, now=0)
+
+    for _ in range(MAX_ATTEMPTS):
+        drain_outbox(outbox, crashing_send, now=outbox["pending"][0]["next_attempt_at"])
+
+    assert outbox["pending"] == []
+    assert [item["url"] for item in outbox["dead_letter"]] == ["a"]
+
+
+def test_drain_outbox_settles_posted_and_failed_items():
+    outbox = empty_outbox()
+    enqueue(outbox, {"url": "a"}, now=0)
+    enqueue(outbox, {"url": "b"}, now=0)
+
+    assert drain_outbox(outbox, lambda articles: ["a"], now=0) == ["a"]
+
+    assert [(item["url"], item["attempts"]) for item in outbox["pending"]] == [("b", 1)]
+
+
+def test_retries_reuse_the_record_key_of_the_first_attempt():
+    outbox = empty_outbox()
+    enqueue(outbox, {"url": "a"}, now=0)
+    sent = []
+
+    def failing_send(articles):
+        sent.append(dict(articles[0]))
+        return []
+
+    drain_outbox(outbox, failing_send, now=0)
+    drain_outbox(outbox, failing_send, now=outbox["pending"][0]["next_attempt_at"])
+
+    assert sent[0]["rkey"] and sent[0]["rkey"] == sent[1]["rkey"]
+    assert sent[0]["created_at"] == sent[1]["created_at"] == 0
+    assert outbox["pending"][0]["article"]["rkey"] == sent[0]["rkey"]
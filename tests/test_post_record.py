@@ -0,0 +1,117 @@
+import datetime
+
+import pytest
+
+from post_record import (
+    ELLIPSIS, MAX_POST_GRAPHEMES, build_facets, build_record, grapheme_length, new_tid, render_text, split_graphemes
+)
+
+URL = "https://www.svenskafans.com/ishockey/nyhet"
+
+
+def facet_text(text, facet):
+    index = facet["index"]
+    return text.encode("utf-8")[index["byteStart"]:index["byteEnd"]].decode("utf-8")
+
+
+def features(facets, kind):
+    return [facet for facet in facets if facet["features"][0]["$type"] == f"app.bsky.richtext.facet#{kind}"]
+
+
+@pytest.mark.parametrize("title", [
+    "Djurgården vann derbyt",
+    "Målvakten förlänger, Järnkaminerna jublar",
+    "🏒 Seger i Hovet 🎉",
+    "Sverige 🇸🇪 och familjen 👨‍👩‍👧 på läktaren",
+])
+def test_facet_offsets_are_utf8_bytes(title):
+    text = f"{title}\n\n{URL}\n\n#DIFhockey"
+
+    link, = features(build_facets(text, links=(URL,)), "link")
+    tag, = features(build_facets(text, links=(URL,)), "tag")
+
+    assert facet_text(text, link) == URL
+    assert facet_text(text, tag) == "#DIFhockey"
+    assert link["index"]["byteStart"] == len(f"{title}\n\n".encode("utf-8"))
+
+
+def test_facet_offsets_for_a_swedish_title():
+    facets = build_facets("Djurgården 🏒\n\n" + URL, links=(URL,))
+
+    # "Djurgården" is 11 bytes, the space 1, the emoji 4 and the newlines 2
+    assert facets[0]["index"] == {"byteStart": 18, "byteEnd": 18 + len(URL)}
+
+
+def test_hashtag_inside_a_url_fragment_is_not_a_tag():
+    url = "https://www.svenskafans.com/ishockey/nyhet#kommentarer"
+    text = f"Djurgården vann\n\n{url}\n\n#DIFhockey"
+
+    facets = build_facets(text, links=(url,))
+
+    assert [facet["features"][0].get("tag") for facet in features(facets, "tag")] == ["DIFhockey"]
+    link, = features(facets, "link")
+    assert facet_text(text, link) == url
+
+
+def test_numeric_hashtag_is_not_a_tag():
+    assert build_facets("Match #2 ikväll") == []
+
+
+def test_facets_are_in_text_order():
+    text = f"#DIF {URL} #hockey"
+    starts = [facet["index"]["byteStart"] for facet in build_facets(text, links=(URL,))]
+    assert starts == sorted(starts)
+
+
+@pytest.mark.parametrize("unit", ["å", "🇸🇪", "👨‍👩‍👧", "🏒", "é"])
+def test_render_text_truncates_to_exactly_the_limit(unit):
+    template = "{title}\n\nDjurgården Hockey\n\n{url}"
+
+    text = render_text(template, unit * 400, URL)
+
+    assert grapheme_length(text) == MAX_POST_GRAPHEMES
+    title = text.split("\n\n")[0]
+    assert title.endswith(ELLIPSIS)
+    # Flags and ZWJ sequences are never cut in half
+    assert set(split_graphemes(title[:-1])) == {unit}
+    assert text.endswith("\n\nDjurgården Hockey\n\n" + URL)
+
+
+def test_render_text_keeps_short_titles():
+    assert render_text("{title}\n\n{url}", "Djurgården 🇸🇪", URL) == f"Djurgården 🇸🇪\n\n{URL}"
+
+
+def test_split_graphemes_keeps_flags_and_zwj_sequences():
+    assert split_graphemes("🇸🇪🇫🇮👨‍👩‍👧a") == ["🇸🇪", "🇫🇮", "👨‍👩‍👧", "a"]
+
+
+def test_build_record():
+    created_at = datetime.datetime(2025, 3, 2, 12, 0, 0, 123456, tzinfo=datetime.timezone.utc)
+
+    record = build_record(URL, "Djurgården vann", "Matchen", thumb={"ref": "blob"},
+                          template="{title}\n\n{url}\n\n#DIFhockey", created_at=created_at)
+
+    assert record["text"] == f"Djurgården vann\n\n{URL}\n\n#DIFhockey"
+    assert record["createdAt"] == "2025-03-02T12:00:00.123Z"
+    assert record["embed"]["external"] == {"uri": URL, "title": "Djurgården vann", "description": "Matchen", "thumb": {"ref": "blob"}}
+    assert len(features(record["facets"], "link")) == 1
+
+
+def test_new_tid_is_a_sortable_record_key():
+    keys = [new_tid(1_700_000_000) for _ in range(5)]
+
+    assert keys == sorted(keys) and len(set(keys)) == 5
+    assert all(len(key) == 13 and key[0] in "234567abcdefghij" for key in keys)
+
+
+def test_rss_to_bluesky_facets():
+    from rss_to_bluesky import build_post
+
+    text, facets = build_post("Djurgården vann 🏒", URL)
+
+    link, = features(facets, "link")
+    tag, = features(facets, "tag")
+    assert link["index"] == {"byteStart": 23, "byteEnd": 23 + len(URL)}
+    assert facet_text(text, link) == URL
+    assert tag["features"][0]["tag"] == "DIFhockey"
+    assert facet_text(text, tag) == "#DIFhockey"
@@ -0,0 +1,154 @@
+import pytest
+
+from outbox import empty_outbox, enqueue, merge_outbox, save_outbox, load_outbox
+from posted_news import MAX_POSTED_NEWS, merge_posted_news, save_posted_news, load_posted_news
+from state_backend import MemoryStateBackend, FileStateBackend, load_state, update_state
+
+
+def item(url, attempts=0):
+    return {"url": url, "article": {"url": url}, "attempts": attempts, "enqueued_at": 0, "next_attempt_at": 0}
+
+
+class ConflictOnce:
+    """An update that lets another run write the key in between, the first time it is called."""
+
+    def __init__(self, backend, key, concurrent_value):
+        self.backend = backend
+        self.key = key
+        self.concurrent_value = concurrent_value
+        self.calls = []
+
+    def __call__(self, current):
+        self.calls.append(current)
+        if len(self.calls) == 1:
+            _, version = self.backend.load(self.key)
+            assert self.backend.compare_and_swap(self.key, self.concurrent_value, version)
+        return current + ["ours"]
+
+
+@pytest.mark.parametrize("make_backend", [
+    lambda tmp_path: MemoryStateBackend({"key.json": ["start"]}),
+    lambda tmp_path: _file_backend(tmp_path),
+])
+def test_update_state_retries_on_conflict(tmp_path, make_backend):
+    backend = make_backend(tmp_path)
+    update = ConflictOnce(backend, "key.json", ["start", "theirs"])
+
+    assert update_state(backend, "key.json", update, []) == ["start", "theirs", "ours"]
+    assert update.calls == [["start"], ["start", "theirs"]]
+    assert load_state(backend, "key.json", []) == ["start", "theirs", "ours"]
+
+
+def _file_backend(tmp_path):
+    backend = FileStateBackend(str(tmp_path))
+    assert backend.compare_and_swap("key.json", ["start"], None)
+    return backend
+
+
+def test_update_state_gives_up_after_retries():
+    backend = MemoryStateBackend({"key.json": []})
+
+    def always_conflicting(current):
+        _, version = backend.load("key.json")
+        backend.compare_and_swap("key.json", current + ["theirs"], version)
+        return current
+
+    with pytest.raises(RuntimeError):
+        update_state(backend, "key.json", always_conflicting, [], retries=3)
+
+
+def test_update_state_starts_from_default():
+    backend = MemoryStateBackend()
+    assert update_state(backend, "new.json", lambda current: current + ["a"], []) == ["a"]
+    assert backend.load("new.json") == (["a"], 1)
+
+
+def test_merge_outbox_keeps_items_from_another_run():
+    current = {"pending": [item("a"), item("theirs")], "dead_letter": []}
+    ours = {"pending": [item("a", attempts=1), item("b")], "dead_letter": []}
+
+    merged = merge_outbox(current, ours)
+
+    assert [entry["url"] for entry in merged["pending"]] == ["a", "theirs", "b"]
+    # Our copy wins for the items this run touched
+    assert merged["pending"][0]["attempts"] == 1
+
+
+def test_merge_outbox_drops_posted_and_dead_lettered_items():
+    current = {"pending": [item("posted"), item("dead"), item("kept")], "dead_letter": [item("old")]}
+    ours = {"pending": [item("kept")], "dead_letter": [item("dead", attempts=6)]}
+
+    merged = merge_outbox(current, ours, posted_urls=["posted"])
+
+    assert [entry["url"] for entry in merged["pending"]] == ["kept"]
+    assert [entry["url"] for entry in merged["dead_letter"]] == ["old", "dead"]
+
+
+def test_save_outbox_merges_with_the_stored_outbox():
+    backend = MemoryStateBackend({"outbox.json": {"pending": [item("theirs"), item("posted")], "dead_letter": []}})
+    outbox = empty_outbox()
+    enqueue(outbox, {"url": "ours"}, now=0)
+
+    save_outbox(backend, "outbox.json", outbox, posted_urls=["posted"])
+
+    assert [entry["url"] for entry in load_outbox(backend, "outbox.json")["pending"]] == ["theirs", "ours"]
+
+
+def test_merge_posted_news_keeps_urls_from_another_run():
+    assert merge_posted_news(["a", "theirs"], ["a", "b"]) == ["a", "theirs", "b"]
+
+
+def test_merge_posted_news_keeps_the_most_recent():
+    current = [f"old-{i}" for i in range(MAX_POSTED_NEWS)]
+    merged = merge_posted_news(current, ["new"])
+    assert len(merged) == MAX_POSTED_NEWS
+    assert merged[-1] == "new"
+    assert "old-0" not in merged
+
+
+def test_save_posted_news_through_backend():
+    backend = MemoryStateBackend({"posted_news.json": ["theirs"]})
+    save_posted_news(backend, "posted_news.json", ["ours"])
+    assert load_posted_news(backend, "posted_news.json") == ["theirs", "ours"]
+
+
+def test_load_posted_news_resets_invalid_state():
+    backend = MemoryStateBackend({"posted_news.json": {"not": "a list"}})
+    assert load_posted_news(backend, "posted_news.json") == []
+
+
+def test_file_backend_writes_utf8(tmp_path, monkeypatch):
+    import builtins
+
+    # Text files opened without an encoding behave as under an ASCII locale
+    original_open = builtins.open
+
+    def ascii_open(file, mode="r", *args, **kwargs):
+        if "b" not in mode and not args:
+            kwargs.setdefault("encoding", "ascii")
+        return original_open(file, mode, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", ascii_open)
+    backend = FileStateBackend(str(tmp_path))
+
+    update_state(backend, "outbox.json", lambda current: current + [{"title": "Djurgården 🏒"}], [])
+
+    assert (tmp_path / "outbox.json").read_bytes().decode("utf-8") == '[{"title": "Djurgården 🏒"}]'
+    assert load_state(backend, "outbox.json", []) == [{"title": "Djurgården 🏒"}]
+
+
+def test_file_backend_removes_temporary_file_when_write_fails(tmp_path):
+    backend = FileStateBackend(str(tmp_path))
+
+    with pytest.raises(TypeError):
+        backend.compare_and_swap("outbox.json", {"not serialisable": object()}, None)
+
+    assert not (tmp_path / "outbox.json.tmp").exists()
+    assert not (tmp_path / "outbox.json").exists()
+
+
+def test_file_backend_resets_undecodable_state(tmp_path):
+    (tmp_path / "posted_news.json").write_bytes(b'["Djurg\xe5rden"]')
+    backend = FileStateBackend(str(tmp_path))
+
+    assert load_posted_news(backend, "posted_news.json") == []